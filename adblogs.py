@@ -1,36 +1,83 @@
-from pynput import keyboard
+import sys
+import threading
+
 import adblogs._globals as g
 from adblogs.colors import *
 from adblogs.history import show_history
-from adblogs.line import line_parse
-from adblogs.keyinput import on_press, on_release
-from adblogs.adb import adb_logs
+from adblogs.assemble import Assembler, idle_batches, parsed_batches
+from adblogs.line import line_parse_batch, swap_args
+from adblogs.filters import FilterWatcher, apply_filters, filter_config_file
+from adblogs.adb import adb_clear, adb_logs
 from adblogs.arguments import log_args
 
 
+def start_key_listener():
+    # pynput starts an input backend when imported, keep it off the startup path
+    from adblogs.keyinput import start_listener
+
+    start_listener()
+
+
 def print_next_line_loop(largs):
-    adb_logs_generator = adb_logs(largs.ip)
+    if largs.adb_clear:
+        adb_clear()
+    adb_logs_generator = adb_logs(largs.ip, largs.buffers, largs.log_history_dir)
+    if largs.workers:
+        from adblogs.pool import pool_loop
+
+        pool_loop(largs, adb_logs_generator)
+        return
+    sink = None
+    if largs.ndjson:
+        from adblogs.sinks import NdjsonSink, record_batch
+
+        sink = NdjsonSink(largs.ndjson)
+    watcher = FilterWatcher(filter_config_file(largs))
+    assembler = None if largs.no_assemble else Assembler()
+    capture = None
+    if largs.trigger:
+        from adblogs.capture import Capture
+
+        capture = Capture(largs)
+    batches = idle_batches(adb_logs_generator)
     while True:
         if not g.pause_logging:
-            line = next(adb_logs_generator)
-            new_line = line_parse(
-                line,
-                largs,
-            )
-            if new_line:
-                g.CURRENT_LINE_NUMBER += 1
-                g.LINE_BUFFER.append(new_line)
+            filters = watcher.poll(largs.filters)
+            if filters:
+                largs = swap_args(apply_filters(largs, filters))
+            for buffer, lines, columns in parsed_batches(
+                next(batches), assembler, largs.format, capture
+            ):
+                if not largs.no_term:
+                    line_parse_batch(
+                        lines,
+                        largs,
+                        buffer,
+                        columns,
+                    )
+                if sink:
+                    sink.write(record_batch(lines, largs, buffer, columns))
 
 
 def main():
     largs = log_args()
+    g.ACTIVE_ARGS = largs
     if largs.debug:
         breakpoint()
     if largs.show_history or largs.clear_history:
         show_history(largs.log_history_file, largs.clear_history)
         return
-    listener = keyboard.Listener(on_press=on_press, on_release=on_release)
-    listener.start()
+    if largs.serve:
+        from adblogs.server import serve
+
+        serve(largs)
+        return
+    threading.Thread(target=start_key_listener, daemon=True).start()
+    if largs.connect:
+        from adblogs.server import connect_loop
+
+        connect_loop(largs)
+        return
     print_next_line_loop(largs)
 
 
@@ -39,3 +86,5 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         pass
+    if g.UNPARSED_LINES:
+        print(f"Unparsed lines: {g.UNPARSED_LINES}", file=sys.stderr)
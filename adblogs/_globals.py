@@ -1,6 +1,8 @@
 import os
+import threading
+from adblogs.budget import BudgetDeque, register
 from adblogs.colors import *
-from collections import deque
+from adblogs.timeline import TimeIndex
 from pathlib import Path
 
 pause_logging = False
@@ -16,10 +18,13 @@ log_levels = {
 
 }
 
+LEVEL_ORDER = {"V": 0, "D": 1, "I": 2, "W": 3, "E": 4, "F": 5, "S": 6}
+
 colors = {
     "process": Fg.green,
     "date": Fg.blue,
     "ip": Fg.red,
+    "buffer": Fg.cyan,
     "time": Fg.yellow,
     "current_time": Fg.magenta,
     "key": Fg.cyan,
@@ -33,12 +38,37 @@ colors = {
     "line_number": Fg.white,
 }
 
-MAX_LINE_BUFFER_SIZE = 1000 * 10
+# Approximate byte budgets, long lines (--raw, big meta) take up more of them than short ones
+LINE_BUFFER_BYTES = 16 * 1024 * 1024
+RAW_BUFFER_BYTES = 32 * 1024 * 1024
+PREFIX_CACHE_BYTES = 1024 * 1024
+# Batches waiting between threads, readers wait (or a client drops lines) past these
+STREAM_QUEUE_BYTES = 8 * 1024 * 1024
+BATCH_QUEUE_BYTES = 8 * 1024 * 1024
+CLIENT_QUEUE_BYTES = 4 * 1024 * 1024
+
+LINE_BUFFER = register("LINE_BUFFER", BudgetDeque(LINE_BUFFER_BYTES))
+
+# (buffer, line) as read from adb indexed by device time,
+# for re-filtering LINE_BUFFER without re-reading and context from every tag
+RAW_BUFFER = register("RAW_BUFFER", TimeIndex(RAW_BUFFER_BYTES))
+
+# Most lines printed as the context of an error block
+MAX_CONTEXT_LINES = 200
 
-LINE_BUFFER = deque(maxlen=MAX_LINE_BUFFER_SIZE)
+# Set when the filters change, LINE_BUFFER is rebuilt from RAW_BUFFER when next needed
+LINE_BUFFER_STALE = False
+
+# Args in use by the main loop, replaced whole when filters are reloaded
+ACTIVE_ARGS = None
 
 CURRENT_LINE_NUMBER = 0
 
+# Held while a line is numbered into LINE_BUFFER, so a rebuild from the key listener can't interleave
+LINE_BUFFER_LOCK = threading.Lock()
+
+UNPARSED_LINES = 0
+
 ARGS_DELIM = ","
 
 ZSH_HISTORY = Path(os.path.expanduser("~/.zsh_history"))
@@ -1,22 +1,208 @@
+import struct
 import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import adblogs._globals as g
+from adblogs.budget import BudgetQueue, register
+
+# Buffers holding binary event records, everything else is read as text
+EVENT_BUFFERS = ["events", "stats", "security"]
+
+EVENT_TAGS_FILE = "/system/etc/event-log-tags"
+EVENT_TAGS = {}
+
+# logger_entry v1 header size, used when hdr_size is 0
+V1_HEADER_SIZE = 20
+
+EVENT_TYPE_INT = 0
+EVENT_TYPE_LONG = 1
+EVENT_TYPE_STRING = 2
+EVENT_TYPE_LIST = 3
+EVENT_TYPE_FLOAT = 4
+
+READ_CHUNK_SIZE = 1024 * 64
+
+
+def adb_cmd(ip=None):
+    if ip:
+        return ["adb", "-s", f"{ip}:5555"]
+    return ["adb"]
 
 
 def adb_clear():
-    print("Clearing logcat!")
+    print("Clearing logcat!", file=sys.stderr)
     subprocess.call(["adb", "logcat", "-c"])
 
 
-def adb_logs(ip=None):
+def load_event_tags(ip=None, cache_dir=None):
+    """
+    Load the event tag number -> name dictionary.
+    Read from the on disk cache if there is one, otherwise pulled from the device once.
+    """
+    if EVENT_TAGS:
+        return EVENT_TAGS
+    cache_file = None
+    content = ""
+    if cache_dir:
+        cache_file = Path(cache_dir) / f"event-log-tags-{ip or 'usb'}"
+        if cache_file.exists():
+            content = cache_file.read_text()
+    if not content:
+        content = subprocess.run(
+            adb_cmd(ip) + ["shell", "cat", EVENT_TAGS_FILE],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        ).stdout.decode(errors="replace")
+        if cache_file and content:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(content)
+    for tag_line in content.splitlines():
+        parts = tag_line.split()
+        if len(parts) < 2 or not parts[0].isdigit():
+            continue
+        EVENT_TAGS[int(parts[0])] = parts[1]
+    return EVENT_TAGS
+
+
+def decode_event_value(payload, offset=0):
+    """Decode one typed event value, returns (value_str, new_offset)"""
+    kind = payload[offset]
+    offset += 1
+    if kind == EVENT_TYPE_INT:
+        return str(struct.unpack_from("<i", payload, offset)[0]), offset + 4
+    if kind == EVENT_TYPE_LONG:
+        return str(struct.unpack_from("<q", payload, offset)[0]), offset + 8
+    if kind == EVENT_TYPE_FLOAT:
+        return str(struct.unpack_from("<f", payload, offset)[0]), offset + 4
+    if kind == EVENT_TYPE_STRING:
+        str_len = struct.unpack_from("<i", payload, offset)[0]
+        offset += 4
+        value = payload[offset: offset + str_len].decode(errors="replace")
+        return value, offset + str_len
+    if kind == EVENT_TYPE_LIST:
+        count = payload[offset]
+        offset += 1
+        values = []
+        for _ in range(count):
+            value, offset = decode_event_value(payload, offset)
+            values.append(value)
+        return "[" + ",".join(values) + "]", offset
+    raise ValueError(f"Unknown event type: {kind}")
+
+
+def read_binary_entries(stream):
+    """Yield (pid, tid, sec, nsec, payload) for each logger_entry in a `logcat -B` stream"""
+    while True:
+        head = stream.read(4)
+        if len(head) < 4:
+            return
+        payload_len, hdr_size = struct.unpack("<HH", head)
+        hdr_size = hdr_size or V1_HEADER_SIZE
+        body = stream.read(hdr_size - 4 + payload_len)
+        if len(body) < hdr_size - 4 + payload_len:
+            return
+        pid, tid, sec, nsec = struct.unpack_from("<iIII", body)
+        yield pid, tid, sec, nsec, body[hdr_size - 4:]
+
+
+def event_line(pid, tid, sec, nsec, payload, event_tags):
+    """Format a binary event as a threadtime line so it goes through the normal parse path"""
+    tag_num = struct.unpack_from("<I", payload)[0]
+    tag = event_tags.get(tag_num, str(tag_num))
+    try:
+        value, _ = decode_event_value(payload, 4) if len(payload) > 4 else ("", 4)
+    except (ValueError, IndexError, struct.error):
+        value = payload[4:].hex()
+    date_time = time.strftime("%m-%d %H:%M:%S", time.localtime(sec))
+    return f"{date_time}.{nsec // 1000000:03d} {pid:5d} {tid:5d} I {tag}: {value}"
+
+
+def read_line_batches(stream):
+    """Yield lists of complete lines from whatever is available on the stream"""
+    tail = b""
+    while True:
+        chunk = stream.read1(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        chunk = tail + chunk
+        end = chunk.rfind(b"\n")
+        if end == -1:
+            tail = chunk
+            continue
+        tail = chunk[end + 1:]
+        lines = [x for x in chunk[:end].decode(errors="replace").splitlines() if x]
+        if lines:
+            yield lines
+
+
+def text_stream(ip, buffers, out_queue):
+    logcat_cmd = adb_cmd(ip) + ["logcat", "-D", "-b", ",".join(buffers)]
+    buffer = buffers[0]
     while True:
-        logcat_cmd = ["adb", "logcat"]
-        if ip:
-            logcat_cmd = ["adb", "-s", f"{ip}:5555", "logcat"]
         ps = subprocess.Popen(logcat_cmd, stdout=subprocess.PIPE, stdin=subprocess.PIPE)
-        while True:
-            line = ps.stdout.readline().decode().strip()
-            if not line:
-                break
-            yield line
-        print("Restarting adb")
+        for lines in read_line_batches(ps.stdout):
+            batch = []
+            for line in lines:
+                # Dividers: --------- beginning of main / --------- switch to crash
+                if line.startswith("--------- "):
+                    if batch:
+                        out_queue.put((buffer, batch))
+                        batch = []
+                    buffer = line.rsplit(" ", 1)[-1]
+                    continue
+                batch.append(line)
+            if batch:
+                out_queue.put((buffer, batch))
+        print("Restarting adb " + ",".join(buffers), file=sys.stderr)
+        ps.kill()
+
+
+def event_stream(ip, buffers, out_queue, cache_dir=None):
+    event_tags = load_event_tags(ip, cache_dir)
+    for buffer in buffers:
+        threading.Thread(
+            target=_event_stream, args=(ip, buffer, out_queue, event_tags), daemon=True
+        ).start()
+
+
+def _event_stream(ip, buffer, out_queue, event_tags):
+    logcat_cmd = adb_cmd(ip) + ["logcat", "-B", "-b", buffer]
+    while True:
+        ps = subprocess.Popen(logcat_cmd, stdout=subprocess.PIPE, stdin=subprocess.PIPE)
+        for pid, tid, sec, nsec, payload in read_binary_entries(ps.stdout):
+            if len(payload) < 4:
+                continue
+            out_queue.put((buffer, [event_line(pid, tid, sec, nsec, payload, event_tags)]))
+        print("Restarting adb " + buffer, file=sys.stderr)
         ps.kill()
 
+
+def adb_logs(ip=None, buffers=None, cache_dir=None):
+    """
+    Yield (buffer, lines) batches, lines being whatever was read in one chunk.
+    Without buffers this reads the default logcat buffers and buffer is None.
+    """
+    if not buffers:
+        while True:
+            ps = subprocess.Popen(
+                adb_cmd(ip) + ["logcat"], stdout=subprocess.PIPE, stdin=subprocess.PIPE
+            )
+            for lines in read_line_batches(ps.stdout):
+                yield None, lines
+            print("Restarting adb", file=sys.stderr)
+            ps.kill()
+
+    out_queue = register("STREAM_QUEUE", BudgetQueue(g.STREAM_QUEUE_BYTES))
+    text_buffers = [x for x in buffers if x not in EVENT_BUFFERS]
+    event_buffers = [x for x in buffers if x in EVENT_BUFFERS]
+    if text_buffers:
+        threading.Thread(
+            target=text_stream, args=(ip, text_buffers, out_queue), daemon=True
+        ).start()
+    if event_buffers:
+        event_stream(ip, event_buffers, out_queue, cache_dir)
+    while True:
+        yield out_queue.get()
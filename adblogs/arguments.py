@@ -1,13 +1,17 @@
 from re import I
 
 import argparse
+import copy
 import os
+import threading
 from pathlib import Path
 
 import adblogs._globals as g
-from adblogs.adb import adb_clear
 from adblogs.utils import a_split
 from adblogs.history import write_log_history
+from adblogs.parse import FORMATS
+from adblogs.filters import apply_filters, compile_filters, load_filter_config
+from adblogs.query import compile_query
 
 
 def log_args() -> argparse.ArgumentParser:
@@ -45,6 +49,71 @@ def log_args() -> argparse.ArgumentParser:
         action="store_true",
     )
     parser.add_argument("-i", "--ip", help="IP")
+    parser.add_argument(
+        "-b",
+        "--buffers",
+        nargs="*",
+        dest="buffers",
+        help="LogcatBuffers (main,system,crash,events)",
+        action="append",
+    )
+    parser.add_argument(
+        "-q",
+        "--query",
+        dest="query",
+        help="FilterQuery eg: (tag=vivi & level>=W | meta.params.x=2) & !msg~zombie",
+    )
+    parser.add_argument(
+        "--format",
+        dest="format",
+        help="LogcatFormat (detected when not given)",
+        choices=list(FORMATS),
+    )
+    parser.add_argument(
+        "-l",
+        "--level",
+        dest="level",
+        help="MinLevel",
+        type=str.upper,
+        choices=list(g.LEVEL_ORDER),
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        help="ParseWorkerProcesses",
+        default=0,
+        type=int,
+    )
+    parser.add_argument(
+        "--config",
+        dest="config",
+        help="FilterConfigJson (reloaded when it changes, without it --log-history-dir/filters.json is only applied once edited)",
+    )
+    parser.add_argument(
+        "--ndjson",
+        dest="ndjson",
+        help="WriteRecordsAsNdjsonToPath (- for stdout)",
+    )
+    parser.add_argument(
+        "--no-term",
+        dest="no_term",
+        help="NoTerminalOutput",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--serve",
+        dest="serve",
+        help="ServeLogsToClients",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--connect",
+        dest="connect",
+        help="ConnectToServer",
+        action="store_true",
+    )
+    parser.add_argument("--socket", dest="socket", help="ServerSocketPath")
     parser.add_argument(
         "-n",
         "--nf",
@@ -94,6 +163,54 @@ def log_args() -> argparse.ArgumentParser:
         default=g.DEFAULT_TIME_LIMIT_SECS,
         type=int,
     )
+    parser.add_argument(
+        "--no-assemble",
+        dest="no_assemble",
+        help="DontMergeStackTraceLines",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trigger",
+        dest="trigger",
+        help="CaptureQuery eg: msg~\"box needs to be installed\" | level>=F",
+    )
+    parser.add_argument(
+        "--capture-before",
+        dest="capture_before",
+        help="SecondsCapturedBeforeATrigger",
+        default=30,
+        type=float,
+    )
+    parser.add_argument(
+        "--capture-after",
+        dest="capture_after",
+        help="SecondsCapturedAfterATrigger",
+        default=10,
+        type=float,
+    )
+    parser.add_argument(
+        "--capture-every",
+        dest="capture_every",
+        help="MinSecondsBetweenCaptures",
+        default=60,
+        type=float,
+    )
+    parser.add_argument("--capture-dir", dest="capture_dir", help="CaptureDir")
+    parser.add_argument(
+        "--context",
+        dest="context_secs",
+        help="SecondsEitherSideOfASeek",
+        default=5,
+        type=float,
+    )
+    parser.add_argument(
+        "--error-context",
+        "--ec",
+        dest="error_context",
+        help="SecondsOfContextFromEveryTagBeforeAnError",
+        default=0,
+        type=float,
+    )
     parser.add_argument(
         "--fp", 
         "--prefixes",
@@ -167,6 +284,12 @@ def log_args() -> argparse.ArgumentParser:
     args.find = a_split(args.find)
 
     args.filter = a_split(args.filter)
+    args.buffers = [
+        buffer
+        for val in a_split(args.buffers)
+        for buffer in val.split(g.ARGS_DELIM)
+        if buffer
+    ]
 
     if args.filter:
         args.highlight_words += args.filter
@@ -181,18 +304,28 @@ def log_args() -> argparse.ArgumentParser:
     if args.no_find:
         args.find = []
     args.log_history_dir = Path(args.log_history_dir)
-    if not args.log_history_dir.exists():
-        args.log_history_dir.mkdir()
-    args.log_history_file = args.log_history_dir / "adb_log_history"
-    write_log_history(parser, args, args.log_history_file)
-    if args.adb_clear:
-        adb_clear()
+    args.log_history_file = args.log_history_dir / "adb_log_history.tsv"
+    # Off the startup path, on a copy as the defaults get merged in below
+    threading.Thread(
+        target=write_log_history,
+        args=(parser, copy.deepcopy(args), args.log_history_file),
+    ).start()
     add_defaults(args, 'highlight_words', g.DEFAULT_HIGHLIGHT_WORDS)
     add_defaults(args, 'exclude_keys', g.DEFAULT_EXCLUDE_KEYS)
     add_defaults(args, 'exclude_values', g.DEFAULT_EXCLUDE_VALUES)
     add_defaults(args, 'exclude_prefixes', g.DEFAULT_EXCLUDE_PREFIXES)
 
-    return args
+    try:
+        if args.trigger:
+            compile_query(args.trigger)
+        filters = compile_filters(vars(args))
+        # Only an explicit --config beats the flags, the default file is what ctrl+' last saved
+        # and only takes over once it's edited during a run
+        if args.config and Path(args.config).exists():
+            filters = load_filter_config(args.config, filters)
+    except ValueError as e:
+        parser.error(str(e))
+    return apply_filters(args, filters)
 
 
 def add_defaults(largs, key, default_val):
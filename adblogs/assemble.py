@@ -0,0 +1,176 @@
+import queue
+import threading
+import time as _time
+from collections import deque
+
+import adblogs._globals as g
+from adblogs.budget import BudgetQueue, register
+from adblogs.parse import parse_batch
+from adblogs.regex import continuation_regex, trace_head_regex
+
+# Lines seen after a record's last line before it's closed
+ASSEMBLE_LOOKAHEAD = 50
+# Seconds since a record's last line before it's closed, also covers an idle stream
+ASSEMBLE_TIMEOUT = 0.5
+# A trace that never ends is cut into records of this many lines
+ASSEMBLE_MAX_LINES = 200
+# Records waiting for continuations at once, the oldest is closed past this
+ASSEMBLE_MAX_OPEN = 64
+# Lines held back for ordering behind open records, the front is closed past this
+ASSEMBLE_MAX_PENDING = 2000
+
+# Levels that can start a trace without looking like one
+TRACE_LEVELS = ("W", "E", "F")
+
+
+class Record:
+    """Lines of one (buffer, pid, tid, tag) merged into a single parsed row"""
+
+    __slots__ = ("buffer", "key", "lines", "row", "messages", "last_seen", "last_time", "closed")
+
+    def __init__(self, buffer, key, line, row, seen, closed=False):
+        self.buffer = buffer
+        self.key = key
+        self.lines = [line]
+        self.row = row
+        self.messages = [row[6]]
+        self.last_seen = seen
+        self.last_time = _time.monotonic()
+        self.closed = closed
+
+    def append(self, line, message, seen):
+        self.lines.append(line)
+        self.messages.append(message)
+        self.last_seen = seen
+        self.last_time = _time.monotonic()
+
+
+class Assembler:
+    """
+    Merges continuation lines (stack frames, causes) into the record they belong to before filtering,
+    so a trace is filtered, found and printed as one.
+    Records are keyed by (buffer, pid, tid, tag) and stay open for ASSEMBLE_LOOKAHEAD lines or ASSEMBLE_TIMEOUT.
+    Lines are let out in their original order, a record holds back the lines after it until it's closed.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.open = {}
+        self.seen = 0
+
+    def feed(self, buffer, lines, columns):
+        """:return: [(buffer, lines, columns)] ready to render, in order"""
+        dates, times, pids, tids, levels, prefixes, messages = columns
+        for i, line in enumerate(lines):
+            self.seen += 1
+            prefix = prefixes[i]
+            if prefix is None:
+                self.pending.append(Record(buffer, None, line, [None] * 7, self.seen, closed=True))
+                continue
+            message = messages[i]
+            key = (buffer, pids[i], tids[i], prefix)
+            record = self.open.get(key)
+            continues = continuation_regex.match(message)
+            if record and continues:
+                record.append(line, message, self.seen)
+                if len(record.lines) >= ASSEMBLE_MAX_LINES:
+                    self.close(record)
+                continue
+            if record:
+                self.close(record)
+            row = [dates[i], times[i], pids[i], tids[i], levels[i], prefix, message]
+            record = Record(buffer, key, line, row, self.seen)
+            if "\"meta\"" not in message and (
+                continues or levels[i] in TRACE_LEVELS or trace_head_regex.match(message)
+            ):
+                self.open[key] = record
+                if len(self.open) > ASSEMBLE_MAX_OPEN:
+                    self.close(self.open[next(iter(self.open))])
+            else:
+                record.closed = True
+            self.pending.append(record)
+        return self.expire()
+
+    def close(self, record):
+        record.closed = True
+        self.open.pop(record.key, None)
+
+    def expire(self):
+        """Close records past the lookahead or timeout, :return: Same as feed"""
+        now = _time.monotonic()
+        for record in list(self.open.values()):
+            if (
+                self.seen - record.last_seen > ASSEMBLE_LOOKAHEAD
+                or now - record.last_time > ASSEMBLE_TIMEOUT
+            ):
+                self.close(record)
+        while len(self.pending) > ASSEMBLE_MAX_PENDING and not self.pending[0].closed:
+            self.close(self.pending[0])
+        return self.ready()
+
+    def flush(self):
+        for record in list(self.open.values()):
+            self.close(record)
+        return self.ready()
+
+    def ready(self):
+        batches = []
+        while self.pending and self.pending[0].closed:
+            record = self.pending.popleft()
+            if not batches or batches[-1][0] != record.buffer:
+                batches.append((record.buffer, [], [[] for _ in range(7)]))
+            _, lines, columns = batches[-1]
+            lines.append("\n".join(record.lines))
+            row = record.row
+            if len(record.messages) > 1:
+                row = row[:6] + ["\n\t".join(record.messages)]
+            for column, val in zip(columns, row):
+                column.append(val)
+        return batches
+
+
+def read_batches(batches, batch_queue):
+    for batch in batches:
+        batch_queue.put(batch)
+
+
+def idle_batches(batches, secs=ASSEMBLE_TIMEOUT):
+    """
+    batches read on a thread, yielding None when nothing arrived for secs
+    so open records can time out while the stream is quiet.
+    """
+    batch_queue = register("BATCH_QUEUE", BudgetQueue(g.BATCH_QUEUE_BYTES))
+    threading.Thread(target=read_batches, args=(batches, batch_queue), daemon=True).start()
+    while True:
+        try:
+            yield batch_queue.get(timeout=secs)
+        except queue.Empty:
+            yield None
+
+
+def parsed_batches(batch, assembler, fmt=None, capture=None):
+    """
+    Parse a batch from idle_batches, index its lines in RAW_BUFFER and check them for capture triggers.
+    :return: [(buffer, lines, columns)] ready to render, assembled unless assembler is None
+    """
+    if batch is None:
+        if capture:
+            capture.expire()
+        return assembler.expire() if assembler else []
+    buffer, lines = batch
+    columns = parse_batch(lines, buffer, fmt)
+    g.RAW_BUFFER.extend(buffer, lines, columns[0], columns[1])
+    if capture:
+        capture.check(buffer, lines, columns)
+    if assembler is None:
+        return [(buffer, lines, columns)]
+    return assembler.feed(buffer, lines, columns)
+
+
+def assemble_all(batches):
+    """Assemble a finished list of (buffer, lines, columns), flushing at the end"""
+    assembler = Assembler()
+    assembled = []
+    for buffer, lines, columns in batches:
+        assembled += assembler.feed(buffer, lines, columns)
+    return assembled + assembler.flush()
@@ -0,0 +1,165 @@
+import queue
+import sys
+import threading
+from collections import deque
+
+# Rough CPython cost of a str object plus the slot holding it, on top of its characters
+ENTRY_OVERHEAD = 64
+
+# name -> buffer or cache, for the memory status view
+MEMORY_STATS = {}
+
+
+def register(name, structure):
+    MEMORY_STATS[name] = structure
+    return structure
+
+
+def unregister(name):
+    MEMORY_STATS.pop(name, None)
+
+
+def entry_size(entry):
+    """Approximate bytes held by a str, or a tuple or list of them"""
+    if isinstance(entry, str):
+        return len(entry) + ENTRY_OVERHEAD
+    if isinstance(entry, (tuple, list)):
+        return ENTRY_OVERHEAD + sum([entry_size(x) for x in entry])
+    if entry is None or isinstance(entry, bool):
+        # Shared singletons
+        return 0
+    return sys.getsizeof(entry)
+
+
+class BudgetDeque:
+    """A deque bounded by the approximate bytes of its entries instead of a count, the oldest go first"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = deque()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, idx):
+        return self.entries[idx]
+
+    def append(self, entry):
+        self.entries.append(entry)
+        self.bytes += entry_size(entry)
+        self.evict()
+
+    def extend(self, entries):
+        for entry in entries:
+            self.entries.append(entry)
+            self.bytes += entry_size(entry)
+        self.evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def evict(self):
+        # Always keep the newest entry, however big
+        while self.bytes > self.budget and len(self.entries) > 1:
+            self.bytes -= entry_size(self.entries.popleft())
+
+
+class BudgetCache(dict):
+    """A dict bounded by the approximate bytes of its items, the oldest inserted go first"""
+
+    def __init__(self, budget):
+        super().__init__()
+        self.budget = budget
+        self.bytes = 0
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.bytes -= entry_size((key, self[key]))
+        super().__setitem__(key, value)
+        self.bytes += entry_size((key, value))
+        while self.bytes > self.budget and len(self) > 1:
+            oldest = next(iter(self))
+            self.bytes -= entry_size((oldest, self[oldest]))
+            super().__delitem__(oldest)
+
+    def clear(self):
+        super().clear()
+        self.bytes = 0
+
+    def __reduce__(self):
+        # Args get pickled to pool workers, rebuild through __setitem__ so the bytes add up
+        return self.__class__, (self.budget,), None, None, iter(self.items())
+
+
+class BudgetQueue:
+    """
+    A thread safe FIFO bounded by the approximate bytes of its items instead of a count.
+    put waits for room, or with block=False reports the item wasn't taken so the caller can drop it.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.entries = deque()
+        self.bytes = 0
+        self.changed = threading.Condition()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, item, block=True):
+        """:return: False when there's no room and block is False"""
+        size = entry_size(item)
+        with self.changed:
+            # An item over the whole budget still goes in on its own
+            while self.entries and self.bytes + size > self.budget:
+                if not block:
+                    return False
+                self.changed.wait()
+            self.entries.append((item, size))
+            self.bytes += size
+            self.changed.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """:raises queue.Empty: When nothing arrived within timeout"""
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.entries, timeout):
+                raise queue.Empty
+            item, size = self.entries.popleft()
+            self.bytes -= size
+            self.changed.notify_all()
+        return item
+
+
+def peak_rss():
+    """Peak resident bytes of this process, None where resource isn't available"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def mb(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f}MB"
+
+
+def memory_report():
+    """:return: Lines of entries, bytes and budget per registered structure"""
+    report = []
+    for name, structure in MEMORY_STATS.items():
+        used = structure.bytes / structure.budget * 100
+        report.append(
+            f"{name}: {len(structure)} entries {mb(structure.bytes)} of {mb(structure.budget)} ({used:.0f}%)"
+        )
+    rss = peak_rss()
+    if rss:
+        report.append(f"Peak RSS: {mb(rss)}")
+    return report
@@ -0,0 +1,109 @@
+import sys
+import threading
+import time as _time
+from pathlib import Path
+
+import adblogs._globals as g
+from adblogs.colors import *
+from adblogs.query import QueryRecord, compile_query
+
+
+def capture_dir(largs):
+    if largs.capture_dir:
+        return Path(largs.capture_dir)
+    return Path(largs.log_history_dir) / "captures"
+
+
+def write_capture(path, header, entries):
+    """Raw lines with logcat style dividers between buffers"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out = [header]
+    buffer = None
+    for entry_buffer, line in entries:
+        if entry_buffer != buffer and entry_buffer:
+            out.append("--------- switch to " + entry_buffer)
+        buffer = entry_buffer
+        out.append(line)
+    with open(path, "w") as f:
+        f.write("\n".join(out) + "\n")
+    # Status goes to stderr, stdout can be an NDJSON stream
+    print(style(f"Captured {len(entries)} lines to {path}", g.colors["highlight"]), file=sys.stderr)
+
+
+class PendingCapture:
+    """A fired trigger collecting its after window"""
+
+    def __init__(self, stamp, trigger_line, entries, after_secs):
+        self.stamp = stamp
+        self.trigger_line = trigger_line
+        self.entries = entries
+        # None when there's no device time to go by, only the host deadline applies
+        self.end_stamp = None if stamp is None else stamp + after_secs
+        # A quiet stream doesn't move the device clock, give up on host time too
+        self.deadline = _time.monotonic() + after_secs
+
+
+class Capture:
+    """
+    Writes every tag's raw lines from --capture-before seconds before a --trigger line
+    to --capture-after seconds after it, whatever the filters.
+    The before window comes out of RAW_BUFFER, which is kept anyway, so watching for a trigger
+    costs one query per line. Triggers during a capture or within --capture-every seconds
+    after one are skipped, the count goes in the next capture written.
+    """
+
+    def __init__(self, largs):
+        self.plan = compile_query(largs.trigger)
+        self.before = largs.capture_before
+        self.after = largs.capture_after
+        self.every = largs.capture_every
+        self.dir = capture_dir(largs)
+        self.pending = None
+        self.next_allowed = 0
+        self.skipped = 0
+
+    def check(self, buffer, lines, columns):
+        """Look for triggers in a parsed batch, after it was added to RAW_BUFFER"""
+        dates, times, pids, _, levels, prefixes, messages = columns
+        if self.pending:
+            self.pending.entries.extend([(buffer, x) for x in lines])
+        for i, line in enumerate(lines):
+            if prefixes[i] is None:
+                record = QueryRecord(None, None, line, buffer)
+            else:
+                record = QueryRecord(levels[i], prefixes[i], messages[i], buffer, pids[i])
+            if not self.plan(record):
+                continue
+            if self.pending or _time.monotonic() < self.next_allowed:
+                self.skipped += 1
+                continue
+            stamp = g.RAW_BUFFER.resolve(dates[i], times[i]) if times[i] else g.RAW_BUFFER.last
+            if stamp is None:
+                # No device time seen yet (brief format, unparsed lines), the whole ring is the before window
+                entries = list(g.RAW_BUFFER)
+            else:
+                # Everything before the trigger, the batch after it is already in
+                entries = g.RAW_BUFFER.window(stamp - self.before, g.RAW_BUFFER.last)
+            self.pending = PendingCapture(stamp, line, entries, self.after)
+            print(style(f"Triggered capture: {line}", g.colors["highlight"]), file=sys.stderr)
+        self.expire()
+
+    def expire(self):
+        """Finish the pending capture once its after window has passed, on device or host time"""
+        pending = self.pending
+        if not pending:
+            return
+        device_done = pending.end_stamp is not None and (g.RAW_BUFFER.last or 0) > pending.end_stamp
+        if not device_done and _time.monotonic() < pending.deadline:
+            return
+        self.pending = None
+        self.next_allowed = _time.monotonic() + self.every
+        name = _time.strftime("capture-%Y%m%d-%H%M%S.log")
+        header = f"# trigger: {pending.trigger_line}"
+        if self.skipped:
+            header += f"\n# {self.skipped} triggers skipped since the last capture"
+            self.skipped = 0
+        # Written on a thread so the log loop doesn't wait on the disk
+        threading.Thread(
+            target=write_capture, args=(self.dir / name, header, pending.entries)
+        ).start()
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import adblogs._globals as g
+from adblogs.query import compile_query
+
+# Seconds between checks of the config file
+WATCH_SECS = 1.0
+
+
+@dataclass(frozen=True)
+class Filters:
+    """
+    Compiled filter state.
+    Never changed in place, a reload builds a new one which is swapped in between batches.
+    """
+
+    show_prefixes: frozenset = frozenset()
+    exclude_prefixes: frozenset = frozenset()
+    show_keys: frozenset = frozenset()
+    exclude_keys: frozenset = frozenset()
+    highlight_keys: frozenset = frozenset()
+    highlight_prefixes: frozenset = frozenset()
+    # Substring matches, kept in order
+    exclude_values: tuple = ()
+    highlight_words: tuple = ()
+    filter: tuple = ()
+    find: tuple = ()
+    find_ignore: tuple = ()
+    level: str = None
+    query: str = None
+
+
+FILTER_KEYS = [x.name for x in fields(Filters)]
+
+# Args attributes memoized from the filters
+FILTER_CACHE_KEYS = ["keep_prefix_cache", "query_plan"]
+
+
+def compile_filters(values):
+    """
+    :param values: Dict with any of FILTER_KEYS, lists for the multi value ones
+    :raises ValueError: On a value of the wrong shape, so a bad config never gets swapped in
+    """
+    compiled = {}
+    for field in fields(Filters):
+        val = values.get(field.name)
+        if field.type in (frozenset, tuple):
+            if val is not None and not isinstance(val, (list, tuple, set, frozenset)):
+                raise ValueError(f"{field.name} should be a list: {val!r}")
+            if val and not all([isinstance(x, str) for x in val]):
+                raise ValueError(f"{field.name} should be a list of strings: {val!r}")
+        elif val is not None and not isinstance(val, str):
+            raise ValueError(f"{field.name} should be a string: {val!r}")
+        if field.type is frozenset:
+            compiled[field.name] = frozenset(val or [])
+        elif field.type is tuple:
+            compiled[field.name] = tuple(dict.fromkeys(val or []))
+        else:
+            compiled[field.name] = val or None
+    if compiled["level"]:
+        compiled["level"] = compiled["level"].upper()
+        if compiled["level"] not in g.LEVEL_ORDER:
+            raise ValueError(f"Unknown level: {compiled['level']}")
+    if compiled["query"]:
+        # Raises on a bad query before it gets swapped in
+        compile_query(compiled["query"])
+    return Filters(**compiled)
+
+
+def filters_dict(filters):
+    """JSON friendly version of filters"""
+    values = {}
+    for key in FILTER_KEYS:
+        val = getattr(filters, key)
+        if isinstance(val, frozenset):
+            val = sorted(val)
+        elif isinstance(val, tuple):
+            val = list(val)
+        values[key] = val
+    return values
+
+
+def apply_filters(largs, filters):
+    """
+    New args with the filter attributes taken from filters.
+    The old args are left alone so anything still using them sees a consistent set.
+    """
+    new_largs = argparse.Namespace(**vars(largs))
+    for key in FILTER_CACHE_KEYS:
+        new_largs.__dict__.pop(key, None)
+    for key in FILTER_KEYS:
+        setattr(new_largs, key, getattr(filters, key))
+    # find gets cleared when a search is broken out of
+    new_largs.find = list(filters.find)
+    new_largs.filters = filters
+    return new_largs
+
+
+def filter_config_file(largs):
+    if largs.config:
+        return Path(largs.config)
+    return Path(largs.log_history_dir) / "filters.json"
+
+
+def write_filter_config(path, filters):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(filters_dict(filters), f, indent=2)
+
+
+def load_filter_config(path, filters):
+    """Keys in the config replace the ones in filters"""
+    with open(path) as f:
+        values = json.load(f)
+    if not isinstance(values, dict):
+        raise ValueError("Filter config should be a JSON object")
+    merged = filters_dict(filters)
+    merged.update({k: v for k, v in values.items() if k in FILTER_KEYS})
+    return compile_filters(merged)
+
+
+class FilterWatcher:
+    """Polls the filter config file, cheap enough to call between every batch"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.mtime = self.current_mtime()
+        self.next_check = 0
+
+    def current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def poll(self, filters):
+        """:return: The reloaded Filters when the file changed, else None"""
+        now = time.monotonic()
+        if now < self.next_check:
+            return None
+        self.next_check = now + WATCH_SECS
+        mtime = self.current_mtime()
+        if mtime is None or mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        try:
+            return load_filter_config(self.path, filters)
+        except (OSError, ValueError) as e:
+            print(f"Not reloading filters from {self.path}: {e}", file=sys.stderr)
+            return None
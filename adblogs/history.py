@@ -3,7 +3,12 @@ import subprocess
 import os
 import adblogs._globals as g
 from pathlib import Path
-from pyfzf import FzfPrompt
+
+LEGACY_HISTORY_FILE = "adb_log_history"
+MAX_HISTORY_ENTRIES = 500
+HISTORY_TAIL_BYTES = 4096
+# Past this the file gets compacted, well above MAX_HISTORY_ENTRIES compacted records
+HISTORY_COMPACT_BYTES = 1024 * 512
 
 
 def write_log_history(parser, largs, log_file):
@@ -17,7 +22,7 @@ def write_log_history(parser, largs, log_file):
         if dest not in parser_option_mapping:
             parser_option_mapping[dest] = item.option_strings
     largs_values = {k: v for k, v in largs.__dict__.items() if v}
-    if "show_history" in largs_values:
+    if "show_history" in largs_values or "clear_history" in largs_values:
         return
     log_str_parts = ["adblog"]
     item_parts = []
@@ -26,6 +31,9 @@ def write_log_history(parser, largs, log_file):
             continue
         if k not in parser_option_mapping:
             continue
+        if not isinstance(v, list) and v == parser.get_default(k):
+            # Options with a default value like --context would be on every entry
+            continue
         option = parser_option_mapping[k][0]
         if isinstance(v, list):
             new_v_parts = []
@@ -40,6 +48,9 @@ def write_log_history(parser, largs, log_file):
         elif isinstance(v, bool):
             pass
         else:
+            if isinstance(v, float) and v.is_integer():
+                # --capture-before 30 rather than "30.0", so it dedupes with what was typed
+                v = int(v)
             # Need to escape quotes
             v = str(v)
             if v in ignore_these_strings:
@@ -53,29 +64,159 @@ def write_log_history(parser, largs, log_file):
         else:
             item_parts += [option]
     log_str_parts = log_str_parts + item_parts
-    log_str = " ".join(log_str_parts) + "\n"
-    # Check whether last line is the same as this one
-    if Path(log_file).exists():
-        content = []
-        with open(log_file, "r") as f:
-            for line in f:
-                content.append(line)
-        if log_str.strip() == content[-1].strip():
-            return
-    with open(log_file, "a") as f:
-        f.write(log_str)
+    log_str = " ".join(log_str_parts)
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+    migrate_legacy_history(log_file)
+    add_history(log_file, log_str)
+
+
+def history_record(cmd, count, last_used):
+    cmd = cmd.replace("\t", " ").replace("\n", " ")
+    return f"{int(last_used)}\t{count}\t{cmd}\n"
+
+
+def parse_history_record(record):
+    """:return: (cmd, count, last_used) or None for a bad line"""
+    parts = record.rstrip("\n").split("\t", 2)
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return parts[2], int(parts[1]), int(parts[0])
+
+
+def last_history_record(f):
+    """
+    Seek to the tail of the history file for its last record.
+    :return: (offset, record) or (None, None) if there isn't one
+    """
+    size = f.seek(0, os.SEEK_END)
+    start = max(0, size - HISTORY_TAIL_BYTES)
+    f.seek(start)
+    tail = f.read().rstrip(b"\n")
+    newline = tail.rfind(b"\n")
+    if newline == -1 and start:
+        # Last record is longer than the tail
+        return None, None
+    record = tail[newline + 1:]
+    if not record:
+        return None, None
+    return start + newline + 1, record.decode(errors="replace")
+
+
+def add_history(log_file, cmd):
+    """
+    Record a use of cmd.
+    A repeat of the last command updates that record in place, otherwise a record is appended.
+    Duplicates further back are merged when the file gets compacted.
+    """
+    now = time.time()
+    with open(log_file, "a+b") as f:
+        offset, record = last_history_record(f)
+        last = parse_history_record(record) if record else None
+        if last and last[0] == cmd:
+            f.seek(offset)
+            f.truncate()
+            f.write(history_record(cmd, last[1] + 1, now).encode())
+        else:
+            f.write(history_record(cmd, 1, now).encode())
+        size = f.tell()
+    if size > HISTORY_COMPACT_BYTES:
+        compact_history(log_file)
+
+
+def read_history(log_file):
+    """:return: ({cmd: [count, last_used]} merged over every record, number of records)"""
+    entries = {}
+    records = 0
+    if not Path(log_file).exists():
+        return entries, records
+    with open(log_file, errors="replace") as f:
+        for record in f:
+            parsed = parse_history_record(record)
+            if not parsed:
+                continue
+            records += 1
+            cmd, count, last_used = parsed
+            if cmd in entries:
+                entries[cmd][0] += count
+                entries[cmd][1] = max(entries[cmd][1], last_used)
+            else:
+                entries[cmd] = [count, last_used]
+    return entries, records
+
+
+def frecency(count, last_used, now):
+    age = now - last_used
+    if age < 60 * 60:
+        return count * 4
+    if age < 60 * 60 * 24:
+        return count * 2
+    if age < 60 * 60 * 24 * 7:
+        return count / 2
+    return count / 4
+
+
+def ranked_history(entries):
+    now = time.time()
+    return sorted(
+        entries.items(), key=lambda x: (frecency(x[1][0], x[1][1], now), x[1][1]), reverse=True
+    )
+
+
+def compact_history(log_file, entries=None):
+    """Rewrite the file with one record per command, keeping the top MAX_HISTORY_ENTRIES"""
+    if entries is None:
+        entries, _ = read_history(log_file)
+    tmp_file = Path(str(log_file) + ".tmp")
+    kept = sorted(ranked_history(entries)[:MAX_HISTORY_ENTRIES], key=lambda x: x[1][1])
+    with open(tmp_file, "w") as f:
+        # Oldest first so the most recent command stays the last record
+        for cmd, (count, last_used) in kept:
+            f.write(history_record(cmd, count, last_used))
+    os.replace(tmp_file, log_file)
+
+
+def migrate_legacy_history(log_file):
+    """Turn the old one command per line history into the store"""
+    legacy_file = Path(log_file).parent / LEGACY_HISTORY_FILE
+    if Path(log_file).exists() or not legacy_file.exists():
+        return
+    entries = {}
+    last_used = int(legacy_file.stat().st_mtime)
+    with open(legacy_file, errors="replace") as f:
+        lines = [x.strip() for x in f if x.strip()]
+    # Only the file time is known, order the commands before it
+    for i, cmd in enumerate(lines):
+        used = last_used - (len(lines) - i)
+        if cmd in entries:
+            entries[cmd][0] += 1
+            entries[cmd][1] = used
+        else:
+            entries[cmd] = [1, used]
+    compact_history(log_file, entries)
 
 
 def show_history(log_file, clear_history):
     if not clear_history:
-        fzf = FzfPrompt()
-        content = []
-        with open(log_file) as f:
-            for line in f:
-                content.append(line.strip())
-        result = fzf.prompt(content, "--tac")
+        migrate_legacy_history(log_file)
+        entries, records = read_history(log_file)
+        if records > len(entries) * 2:
+            compact_history(log_file, entries)
+        # Best first, fzf shows the first entry next to the prompt
+        fzf = subprocess.Popen(
+            ["fzf", "--no-sort", "--exact", "-i"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        try:
+            for cmd, _ in ranked_history(entries):
+                fzf.stdin.write((cmd + "\n").encode())
+            fzf.stdin.close()
+        except BrokenPipeError:
+            pass
+        result = fzf.stdout.read().decode().strip()
+        fzf.wait()
         if result:
-            cmd = result[0]
+            cmd = result
             print(cmd)
             unix_time = int(time.time())
             with open(g.ZSH_HISTORY, "a") as f:
@@ -85,4 +226,5 @@ def show_history(log_file, clear_history):
 
     else:
         print("Clearing history: " + str(log_file))
-        os.system("rm " + str(log_file))
+        Path(log_file).unlink(missing_ok=True)
+        (Path(log_file).parent / LEGACY_HISTORY_FILE).unlink(missing_ok=True)
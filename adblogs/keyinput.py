@@ -1,19 +1,29 @@
-from pyfzf import FzfPrompt
 from pynput import keyboard
-from pathlib import Path
+import os
 
 import adblogs._globals as g
 import subprocess
+from adblogs.budget import memory_report
+from adblogs.colors import style
+from adblogs.filters import filter_config_file, write_filter_config
+from adblogs.line import print_context, refilter_buffer, show_context
+from adblogs.utils import check_continue
 
 
 combo1 = [{keyboard.Key.ctrl, keyboard.KeyCode(vk=47)}]  # ctrl + /
 combo2=  [{keyboard.Key.ctrl, keyboard.KeyCode(vk=39)}]  # ctrl + '
+combo3 = [{keyboard.Key.ctrl, keyboard.KeyCode(vk=93)}]  # ctrl + ]
+combo4 = [{keyboard.Key.ctrl, keyboard.KeyCode(vk=59)}]  # ctrl + ;
 
 pressed_vks = set()
 
 
 def show_prompt():
+    from pyfzf import FzfPrompt
+
     g.pause_logging = True
+    if g.LINE_BUFFER_STALE:
+        refilter_buffer(g.ACTIVE_ARGS)
     fzf = FzfPrompt()
     fzf_options = '--prompt=">> "'
     fzf_options += " --ansi"
@@ -25,18 +35,47 @@ def show_prompt():
     fzf_options += " --color 'bg+:#000000,bg:#313131,preview-bg:#000000,border:#778899'"
     try:
         result = fzf.prompt(choices=list(g.LINE_BUFFER), fzf_options=fzf_options)
+        if result:
+            # The chosen line with what every tag logged around it
+            show_context(result[0], g.ACTIVE_ARGS)
+            check_continue("Context", g.ACTIVE_ARGS.time_limit)
     except:
         pass
     g.pause_logging = False
 
 
+def seek_time():
+    """Show what every tag logged around a typed device time"""
+    g.pause_logging = True
+    secs = g.ACTIVE_ARGS.context_secs
+    try:
+        entries = g.RAW_BUFFER.seek(input("Seek to [MM-DD] HH:MM[:SS] >> "), secs)
+        print_context(f"{secs:g}s either side, every tag:", entries)
+        check_continue("Seek", g.ACTIVE_ARGS.time_limit)
+    except ValueError as e:
+        print(e)
+    g.pause_logging = False
+
+
 def execute():
     """My function to execute when a combination is pressed"""
     show_prompt()
 
-def test():
-    script = Path(__file__).parent / "bin" / "args_switcher.py"
-    subprocess.call(["python", script])
+def edit_filters():
+    """Open the current filters in $EDITOR, the main loop reloads them once saved"""
+    g.pause_logging = True
+    config_file = filter_config_file(g.ACTIVE_ARGS)
+    write_filter_config(config_file, g.ACTIVE_ARGS.filters)
+    subprocess.call([os.environ.get("EDITOR", "vi"), str(config_file)])
+    g.pause_logging = False
+
+
+def show_status():
+    """Memory used by each buffer and cache against its budget"""
+    g.pause_logging = True
+    print(style("\n".join(memory_report()), g.colors["highlight"]))
+    check_continue("Status", g.ACTIVE_ARGS.time_limit)
+    g.pause_logging = False
 
 
 def get_vk(key):
@@ -65,7 +104,13 @@ def on_press(key):
         execute()  # If they are all pressed, call your function
     
     elif pressed_combo(combo2):
-        test()
+        edit_filters()
+
+    elif pressed_combo(combo3):
+        seek_time()
+
+    elif pressed_combo(combo4):
+        show_status()
         
 
 
@@ -77,3 +122,9 @@ def on_release(key):
         pressed_vks.remove(vk)
     except:
         pass
+
+
+def start_listener():
+    listener = keyboard.Listener(on_press=on_press, on_release=on_release)
+    listener.start()
+    return listener
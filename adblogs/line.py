@@ -1,18 +1,41 @@
 import json
-import random
-from datetime import datetime
+import re
+import sys
+import time as _time
+import zlib
+from itertools import groupby
 from operator import itemgetter
 
 import adblogs._globals as g
+from adblogs.budget import BudgetCache, register
 from adblogs.colors import *
+from adblogs.meta import MetaView, extract_meta, meta_fields
+from adblogs.parse import fresh_formats, parse_batch
+from adblogs.query import query_match
 from adblogs.regex import *
-from adblogs.utils import flatten, check_continue
+from adblogs.utils import check_continue
 
-SEEN_PREFIXES = {}
+# Both rebuild the same from the prefix when evicted
+SEEN_PREFIXES = register("SEEN_PREFIXES", BudgetCache(g.PREFIX_CACHE_BYTES))
+STYLED_TAGS = register("STYLED_TAGS", BudgetCache(g.PREFIX_CACHE_BYTES))
 PREFIX_CHOOSE_COLORS = [Fg.red, Fg.cyan, Fg.magenta, Fg.green]
 LINE_SEP = "|"
+COL_SEP = " " + LINE_SEP + " "
 PROCESS_NAME = "gf-adb"
 
+# Date and time columns of a rendered line
+DATE_COLUMN_REGEX = re.compile(r"(?:\d{4}-)?\d\d-\d\d")
+TIME_COLUMN_REGEX = re.compile(r"\d\d:\d\d:\d\d")
+LEVEL_COLUMNS = {name.strip() for name, _ in g.log_levels.values()}
+
+
+def prefix_color(prefix):
+    """Colors are hashed from the prefix so they're the same across runs and worker processes"""
+    if prefix not in SEEN_PREFIXES:
+        color_idx = zlib.crc32(prefix.encode()) % len(PREFIX_CHOOSE_COLORS)
+        SEEN_PREFIXES[prefix] = PREFIX_CHOOSE_COLORS[color_idx]
+    return SEEN_PREFIXES[prefix]
+
 
 def parse_json_line(json_str, message=None):
     json_str = json_str.replace("\\", "")
@@ -70,60 +93,26 @@ def pause_line(search_content, largs):
 
 # MAX_SUB_PREFIX = 0
 
-def parse_meta_line(message, largs):
-    error = ""
-    will_show = True
-    prefix = ""
-
-    if any([x in message for x in g.BROKEN_MSGS]):
-        return message, error, will_show, prefix
-    try:
-        json_obj = json.loads(message)
-    except:
-        # Can't parse json just return
-        return message, error, will_show, prefix
-    if 'error' in json_obj:
-        error = json_obj['error']
-
-    start_brace_idx = json_obj['message'].find('{')
-    json_str = None
-    parts = []
-    obj = {'params': json_obj['params']}
-    msg = ""
-    if start_brace_idx == -1:
-        msg = json_obj['message']
-    else:
-        msg = json_obj['message'][0:start_brace_idx]
-        json_str = json_obj['message'][start_brace_idx:]
-    if json_str:
-        try:
-            inner_obj = json.loads(json_str)
-            obj.update(inner_obj)
-        except:
-            msg = json_obj['message']
-
-    prefix = json_obj['meta']['name']
+def parse_meta_line(message, largs, view=None):
+    meta = view.decoded if view else extract_meta(message)
+    if meta is None:
+        return message, "", True, ""
+    msg, obj, error, prefix = meta
 
+    will_show = True
     if largs.exclude_prefixes and prefix in largs.exclude_prefixes:
         will_show = False
 
-    if prefix not in SEEN_PREFIXES:
-        SEEN_PREFIXES[prefix] = random.choice(PREFIX_CHOOSE_COLORS)
-    parts.append(style(f"{prefix}", SEEN_PREFIXES[prefix]))
+    parts = []
+    parts.append(styled_tag(prefix))
     parts.append(LINE_SEP)
     parts.append(style(msg, g.colors['submessage']))
     parts.append(LINE_SEP)
     if largs.raw:
         obj['raw'] = style(message, Fg.green)
 
-    obj = flatten(obj)
+    obj, error = meta_fields(obj, error)
     obj_parts = []
-    if "error.stack" in obj:
-        error = obj['error.stack'].replace("  ", "\n")
-        del obj['error.stack']
-    if "error.error.stack" in obj:
-        error = obj['error.error.stack'].replace("  ", "\n")
-        del obj['error.error.stack']
     if error:
         parts += [style("see error below", Fg.red), LINE_SEP]
     for k, v in obj.items():
@@ -140,67 +129,146 @@ def parse_meta_line(message, largs):
     return message, error, will_show, prefix
 
 
-def pretty_line(
-    date,
-    time,
-    current_time,
-    level,
-    prefix,
-    message,
-    largs,
-):
-    parts = []
+class LineTemplate:
+    """
+    Pre-styled pieces of a line, compiled once per run from largs.
+    Constant columns are styled once and the current time once per second,
+    so a line renders as one join.
+    """
+
+    def __init__(self, largs):
+        head = [style(PROCESS_NAME, g.colors["process"])]
+        if largs.ip:
+            head.append(style(largs.ip, g.colors["ip"]))
+        self.head = "".join([x + COL_SEP for x in head])
+        self.show_current_time = not largs.no_current_time
+        self.levels = {
+            level: style(name, col) + COL_SEP for level, (name, col) in g.log_levels.items()
+        }
+        self.buffers = {}
+        self.dates = {}
+        self.current_second = None
+        self.current_time = ""
+
+    def level(self, level):
+        if level not in self.levels:
+            self.levels[level] = style(level, g.colors["message"]) + COL_SEP
+        return self.levels[level]
+
+    def buffer(self, buffer):
+        if buffer not in self.buffers:
+            self.buffers[buffer] = style(buffer, g.colors["buffer"]) + COL_SEP if buffer else ""
+        return self.buffers[buffer]
+
+    def date(self, date):
+        if date not in self.dates:
+            self.dates[date] = style(date, g.colors["date"]) + COL_SEP if date else ""
+        return self.dates[date]
+
+    def now(self):
+        if not self.show_current_time:
+            return ""
+        now = int(_time.time())
+        if now != self.current_second:
+            self.current_second = now
+            current_time = _time.strftime("%H:%M:%S", _time.localtime(now))
+            self.current_time = style(current_time, g.colors["current_time"]) + COL_SEP
+        return self.current_time
+
+    def columns(self, buffer, date, time, level):
+        """Everything before the tag"""
+        return "".join(
+            [
+                self.head,
+                self.buffer(buffer),
+                self.date(date),
+                self.now(),
+                # Seconds are enough on screen, the fraction is kept for records
+                g.colors["time"] + time[:8] + RESET + COL_SEP if time else "",
+                self.level(level),
+            ]
+        )
 
-    parts.append(style(str(g.CURRENT_LINE_NUMBER), g.colors["line_number"]))
-    parts.append(LINE_SEP)
 
-    parts.append(style(PROCESS_NAME, g.colors["process"]))
-    parts.append(LINE_SEP)
+def line_template(largs):
+    if getattr(largs, "template", None) is None:
+        largs.template = LineTemplate(largs)
+    return largs.template
 
-    if largs.ip:
-        parts.append(style(largs.ip, g.colors["ip"]))
-        parts.append(LINE_SEP)
 
-    parts.append(style(date, g.colors["date"]))
-    parts.append(LINE_SEP)
+def styled_tag(prefix):
+    if prefix not in STYLED_TAGS:
+        STYLED_TAGS[prefix] = style(prefix, prefix_color(prefix))
+    return STYLED_TAGS[prefix]
 
-    if not largs.no_current_time:
-        parts.append(style(current_time, g.colors["current_time"]))
-        parts.append(LINE_SEP)
 
-    parts.append(style(time, g.colors["time"]))
-    parts.append(LINE_SEP)
+def meta_prefix(prefix, subprefix, largs):
+    """prefix:subprefix when there's a filter for it"""
+    will_update_prefix = False
+    if largs.show_prefixes and any([prefix in x and ':' in x for x in largs.show_prefixes]):
+        will_update_prefix = True
+    if largs.exclude_prefixes and any([prefix in x and ':' in x for x in largs.exclude_prefixes]):
+        will_update_prefix = True
+    if will_update_prefix:
+        return prefix + ":" + subprefix
+    return prefix
 
-    parts.append(style(g.log_levels[level][0], g.log_levels[level][1]))
-    parts.append(LINE_SEP)
 
-    if prefix not in SEEN_PREFIXES:
-        SEEN_PREFIXES[prefix] = random.choice(PREFIX_CHOOSE_COLORS)
-    parts.append(style(prefix, SEEN_PREFIXES[prefix]))
+def excluded_prefix(prefix, largs):
+    if largs.show_prefixes and prefix not in largs.show_prefixes:
+        return True
+    if largs.exclude_prefixes and prefix in largs.exclude_prefixes:
+        return True
+    return False
+
+
+def meta_excluded(prefix, view, largs):
+    """Whether the scanned meta name alone rules the line out, before it's decoded"""
+    if not (largs.show_prefixes or largs.exclude_prefixes):
+        return False
+    subprefix = view.name
+    if subprefix is None:
+        return False
+    if largs.exclude_prefixes and subprefix in largs.exclude_prefixes:
+        return True
+    return excluded_prefix(meta_prefix(prefix, subprefix, largs), largs)
+
+
+def excluded_value(message, largs):
+    if largs.exclude_values:
+        for val in largs.exclude_values:
+            if val in message:
+                return True
+    return False
+
+
+def pretty_line(
+    date,
+    time,
+    level,
+    prefix,
+    message,
+    largs,
+    buffer=None,
+):
+    styled_prefix = styled_tag(prefix)
 
     error = ""
     will_show = True
     if "\"meta\"" in message:
-        message, error, will_show, subprefix = parse_meta_line(message, largs)
-        will_update_prefix = False
-        if largs.show_prefixes and any([prefix in x and ':' in x for x in largs.show_prefixes]):
-            will_update_prefix = True
-        if largs.exclude_prefixes and any([prefix in x and ':' in x for x in largs.exclude_prefixes]):
-            will_update_prefix = True
-        if will_update_prefix:
-            prefix = prefix + ":" + subprefix
-    if largs.show_prefixes and prefix not in largs.show_prefixes:
-        return "", error
-    if largs.exclude_prefixes and prefix in largs.exclude_prefixes:
+        view = MetaView(message)
+        if meta_excluded(prefix, view, largs):
+            return "", error
+        message, error, will_show, subprefix = parse_meta_line(message, largs, view)
+        prefix = meta_prefix(prefix, subprefix, largs)
+    if excluded_prefix(prefix, largs):
         return "", error
 
     if not will_show:
         return "", error
 
-    if largs.exclude_values:
-        for val in largs.exclude_values:
-            if val in message:
-                return "", error
+    if excluded_value(message, largs):
+        return "", error
 
     if largs.highlight_prefixes and prefix in largs.highlight_prefixes:
         message = remove_col_from_val(message)
@@ -218,71 +286,323 @@ def pretty_line(
                 words_to_highlight.append(exact_word)
     for word in words_to_highlight:
         message = message.replace(word, style(word, g.colors["highlight"]))
-    parts.append(LINE_SEP)
-    parts.append(style(message, g.colors["message"]))
-
-    line = " ".join(parts)
+    columns = line_template(largs).columns(buffer, date, time, level)
+    line = "".join([columns, styled_prefix, COL_SEP, style(message, g.colors["message"])])
     return line, error
 
 
-def line_parse(
-    line,
-    largs,
-):
-    global CURRENT_LINE_NUMBER
-    new_line = None
-    result = line_regex.match(line)
-    search_content = [line]
-    error = ""
-    if result:
-        date, time, level, prefix, message = itemgetter(
-            "date", "time", "level", "prefix", "message"
-        )(result.groupdict())
-        date = date.strip()
-        time = time.strip()
-        level = level.strip()
-        prefix = prefix.split(":")[0].strip().replace(" ", "_")
-        now = datetime.now()
-        current_time = now.strftime("%H:%M:%S")
-        message = message.strip()
-        if not message:
-            return None
-        time = time.split(".")[0]
-        clean_message = message.replace("\\n", "")
-        clean_message = message.replace("\\", "")
-        search_content = [prefix, clean_message]
-
-        line, error = pretty_line(
-            date,
-            time,
-            current_time,
-            level,
-            prefix,
-            message,
-            largs,
+def keep_prefix(prefix, largs):
+    """
+    Whether a tag can survive the prefix filters, before anything is rendered.
+    Tags with a prefix:subprefix filter are kept as the subprefix is only known after the meta parse.
+    """
+    keep_cache = largs.__dict__.get("keep_prefix_cache")
+    if keep_cache is None:
+        keep_cache = largs.keep_prefix_cache = register(
+            "keep_prefix_cache", BudgetCache(g.PREFIX_CACHE_BYTES)
         )
-    if largs.filter:
-        if any([filter_word in line for filter_word in largs.filter]):
-            new_line = line
-        else:
-            new_line = ""
+    if prefix in keep_cache:
+        return keep_cache[prefix]
+    has_sub_filter = any(
+        [prefix in x and ":" in x for x in (largs.show_prefixes or [])]
+        + [prefix in x and ":" in x for x in (largs.exclude_prefixes or [])]
+    )
+    keep = True
+    if largs.show_prefixes and prefix not in largs.show_prefixes and not has_sub_filter:
+        keep = False
+    if largs.exclude_prefixes and prefix in largs.exclude_prefixes and not has_sub_filter:
+        keep = False
+    keep_cache[prefix] = keep
+    return keep
+
+
+def keep_record(level, prefix, largs):
+    if largs.level and g.LEVEL_ORDER.get(level, 0) < g.LEVEL_ORDER[largs.level]:
+        return False
+    return keep_prefix(prefix, largs)
+
+
+def find_hit(search_content, largs):
+    """Cheap check whether any find term is in the line, pause_line does the rest"""
+    if not largs.find:
+        return None
+    if largs.find_case_sensitive:
+        hit = any([find_str in x for find_str in largs.find for x in search_content])
     else:
-        new_line = line
-    if new_line:
+        lowered = [x.lower() for x in search_content]
+        hit = any([find_str.lower() in x for find_str in largs.find for x in lowered])
+    return search_content if hit else None
+
+
+def filter_line(line, largs):
+    if largs.filter and not any([filter_word in line for filter_word in largs.filter]):
+        return ""
+    return line
+
+
+def print_error(error):
+    num_error_dashes = 150
+    error = error.replace('\n\n', '\n')
+    error_parts = error.split('\n')
+    print(style("-" * num_error_dashes, Fg.red))
+    error_str = style(error_parts[0], Fg.red)
+    error_str += "\n\t" + "\n\t".join([x for x in error_parts[1:] if x])
+    print(error_str)
+    print(style("-" * num_error_dashes, Fg.red))
+
+
+def line_stamp(line, largs):
+    """
+    RAW_BUFFER stamp of a rendered line from its device date and time columns, None without a time.
+    Works on the plain text too, which is what fzf hands back.
+    """
+    date = None
+    times = []
+    # Columns up to the level, the message could hold anything
+    for column in remove_col_from_val(line).split(COL_SEP):
+        column = column.strip()
+        if column in LEVEL_COLUMNS:
+            break
+        if DATE_COLUMN_REGEX.fullmatch(column):
+            date = column
+        elif TIME_COLUMN_REGEX.fullmatch(column):
+            times.append(column)
+    if not largs.no_current_time:
+        # The first is when it was printed
+        times = times[1:]
+    if not times:
+        return None
+    return g.RAW_BUFFER.resolve(date, times[-1])
+
+
+def print_context(title, entries):
+    """Raw lines from every tag, unfiltered"""
+    print(style(title, Fg.magenta))
+    for buffer, raw_line in entries:
+        print("  " + (style(buffer, g.colors["buffer"]) + COL_SEP if buffer else "") + raw_line)
+
+
+def show_context(line, largs):
+    """Print the raw lines from every tag within --context seconds of a rendered line"""
+    secs = largs.context_secs
+    stamp = line_stamp(line, largs)
+    if stamp is None:
+        print("No device time on this line")
+        return
+    print_context(f"{secs:g}s either side, every tag:", g.RAW_BUFFER.around(stamp, secs))
+
+
+def output_line(line, error, search_content, largs):
+    """Print a rendered line, this is the only part that has to run in order"""
+    if line:
+        with g.LINE_BUFFER_LOCK:
+            line = " ".join(
+                [style(str(g.CURRENT_LINE_NUMBER), g.colors["line_number"]), LINE_SEP, line]
+            )
+            g.CURRENT_LINE_NUMBER += 1
+            g.LINE_BUFFER.append(line)
         # Do the print!
-        print(new_line)
+        print(line)
         if error:
-            num_error_dashes = 150
-            error = error.replace('\n\n', '\n')
-            error_parts = error.split('\n')
-            print(style("-" * num_error_dashes, Fg.red))
-            error_str = style(error_parts[0], Fg.red)
-            error_str += "\n\t" + "\n\t".join([x for x in error_parts[1:] if x])
-            print(error_str)
-            print(style("-" * num_error_dashes, Fg.red))
-        pass
+            if largs.error_context:
+                stamp = line_stamp(line, largs)
+                if stamp is not None:
+                    entries = g.RAW_BUFFER.window(stamp - largs.error_context, stamp)
+                    print_context(
+                        f"{largs.error_context:g}s before, every tag:",
+                        entries[-g.MAX_CONTEXT_LINES:],
+                    )
+            print_error(error)
+    if search_content:
+        find_line(search_content, largs)
+    return line
+
+
+def find_line(search_content, largs):
     if largs.find:
         keep_pausing = pause_line(search_content, largs)
         if not keep_pausing:
             largs.find = []
-    return new_line
+
+
+def keep_unparsed(line, largs, buffer=None):
+    """Whether a line no parser understood survives the filters that don't need fields"""
+    if largs.show_prefixes or largs.level:
+        return False
+    if excluded_value(line, largs):
+        return False
+    return query_match(None, None, line, largs, buffer)
+
+
+def unparsed_line(line, largs, buffer=None, count=True):
+    """Lines no parser understood, only the filters that don't need fields apply"""
+    if count:
+        g.UNPARSED_LINES += 1
+    if not keep_unparsed(line, largs, buffer):
+        return ""
+    return line
+
+
+def regex_fields(line):
+    """:return: (date, time, level, prefix, message) or None"""
+    result = line_regex.match(line)
+    if not result:
+        return None
+    date, time, level, prefix, message = itemgetter(
+        "date", "time", "level", "prefix", "message"
+    )(result.groupdict())
+    date = date.strip()
+    time = time.strip()
+    level = level.strip()
+    prefix = prefix.split(":")[0].strip().replace(" ", "_")
+    message = message.strip()
+    return date, time, level, prefix, message
+
+
+def render_line(
+    line,
+    largs,
+    buffer=None,
+    count_unparsed=True,
+):
+    """
+    Regex fallback for a single line the format parser couldn't handle.
+    :param count_unparsed: False when re-rendering lines already counted
+    :return: (rendered_line, error, search_content) search_content is only set on a find hit
+    """
+    if line.startswith("--------- "):
+        # Buffer dividers aren't log lines, don't count or print them as unparsed
+        return "", "", None
+    fields = regex_fields(line)
+    if not fields:
+        rendered = unparsed_line(line, largs, buffer, count_unparsed)
+        return filter_line(rendered, largs), "", find_hit([line], largs)
+    date, time, level, prefix, message = fields
+    if not message:
+        return "", "", None
+    clean_message = message.replace("\\", "")
+    search_content = find_hit([prefix, clean_message], largs)
+    if not keep_record(level, prefix, largs) or not query_match(
+        level, prefix, message, largs, buffer
+    ):
+        return "", "", search_content
+
+    line, error = pretty_line(
+        date,
+        time,
+        level,
+        prefix,
+        message,
+        largs,
+        buffer,
+    )
+    return filter_line(line, largs), error, search_content
+
+
+def render_batch(
+    lines,
+    largs,
+    buffer=None,
+    columns=None,
+    count_unparsed=True,
+):
+    """
+    Parse and render a block of lines at once, only lines surviving the tag and level filters are rendered.
+    Lines the stream's format parser can't handle fall back to render_line.
+    Doesn't print or touch the line buffer so it can run in a worker process.
+    :param columns: parse_batch output when the batch has already been parsed
+    :param count_unparsed: False when re-rendering lines already counted
+    :return: List of (rendered_line, error, search_content) for lines with something to output
+    """
+    rendered = []
+    if columns is None:
+        columns = parse_batch(lines, buffer, largs.format)
+    dates, times, pids, _, levels, prefixes, messages = columns
+    for i, prefix in enumerate(prefixes):
+        if prefix is None:
+            result = render_line(lines[i], largs, buffer, count_unparsed)
+        else:
+            message = messages[i]
+            if not message:
+                continue
+            search_content = find_hit([prefix, message.replace("\\", "")], largs)
+            if not keep_record(levels[i], prefix, largs) or not query_match(
+                levels[i], prefix, message, largs, buffer, pids[i]
+            ):
+                result = "", "", search_content
+            else:
+                line, error = pretty_line(
+                    dates[i],
+                    times[i],
+                    levels[i],
+                    prefix,
+                    message,
+                    largs,
+                    buffer,
+                )
+                result = filter_line(line, largs), error, search_content
+        if result[0] or result[2]:
+            rendered.append(result)
+    return rendered
+
+
+def line_parse(
+    line,
+    largs,
+    buffer=None,
+):
+    return output_line(*render_line(line, largs, buffer), largs)
+
+
+def line_parse_batch(
+    lines,
+    largs,
+    buffer=None,
+    columns=None,
+):
+    new_lines = []
+    for line, error, search_content in render_batch(lines, largs, buffer, columns):
+        new_line = output_line(line, error, search_content, largs)
+        if new_line:
+            new_lines.append(new_line)
+    return new_lines
+
+
+def refilter_buffer(largs):
+    """
+    Rebuild LINE_BUFFER from RAW_BUFFER with the current filters, nothing is re-read from adb.
+    Runs on the key listener thread, so it parses with its own parser instances
+    and numbering carries on from the rebuilt lines.
+    """
+    from adblogs.assemble import assemble_all
+
+    formats = fresh_formats()
+    batches = []
+    for buffer, entries in groupby(list(g.RAW_BUFFER), key=itemgetter(0)):
+        lines = [x[1] for x in entries]
+        batches.append((buffer, lines, parse_batch(lines, buffer, largs.format, formats)))
+    if not largs.no_assemble:
+        batches = assemble_all(batches)
+    rendered_lines = []
+    for buffer, lines, columns in batches:
+        for rendered, _, _ in render_batch(lines, largs, buffer, columns, count_unparsed=False):
+            if rendered:
+                rendered_lines.append(rendered)
+    with g.LINE_BUFFER_LOCK:
+        g.LINE_BUFFER.clear()
+        g.LINE_BUFFER.extend(
+            [
+                " ".join([style(str(i), g.colors["line_number"]), LINE_SEP, rendered])
+                for i, rendered in enumerate(rendered_lines)
+            ]
+        )
+        g.CURRENT_LINE_NUMBER = len(rendered_lines)
+    g.LINE_BUFFER_STALE = False
+
+
+def swap_args(new_largs):
+    """Called between batches when the filters were reloaded"""
+    g.ACTIVE_ARGS = new_largs
+    g.LINE_BUFFER_STALE = True
+    print(style("Filters reloaded", g.colors["highlight"]), file=sys.stderr)
+    return new_largs
@@ -0,0 +1,118 @@
+import json
+import re
+
+import adblogs._globals as g
+from adblogs.utils import flatten
+
+# The meta object up to its first nested value, the name is scanned from this
+META_HEAD_REGEX = re.compile(r'"meta"\s*:\s*\{([^{}]*)')
+NAME_REGEX = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def extract_meta(message):
+    """
+    Unstyled parts of a meta line.
+    :return: (msg, obj, error, prefix) or None when it isn't a meta line we can parse
+    """
+    if any([x in message for x in g.BROKEN_MSGS]):
+        return None
+    try:
+        json_obj = json.loads(message)
+    except:
+        # Can't parse json just return
+        return None
+    error = ""
+    if 'error' in json_obj:
+        error = json_obj['error']
+
+    start_brace_idx = json_obj['message'].find('{')
+    json_str = None
+    obj = {'params': json_obj['params']}
+    msg = ""
+    if start_brace_idx == -1:
+        msg = json_obj['message']
+    else:
+        msg = json_obj['message'][0:start_brace_idx]
+        json_str = json_obj['message'][start_brace_idx:]
+    if json_str:
+        try:
+            inner_obj = json.loads(json_str)
+            obj.update(inner_obj)
+        except:
+            msg = json_obj['message']
+
+    prefix = json_obj['meta']['name']
+    return msg, obj, error, prefix
+
+
+def meta_fields(obj, error=""):
+    """Flatten a meta obj, pulling the error stack out of it"""
+    obj = flatten(obj)
+    if "error.stack" in obj:
+        error = obj['error.stack'].replace("  ", "\n")
+        del obj['error.stack']
+    if "error.error.stack" in obj:
+        error = obj['error.error.stack'].replace("  ", "\n")
+        del obj['error.error.stack']
+    if error and not isinstance(error, str):
+        error = json.dumps(error)
+    return obj, error
+
+
+def json_string(raw):
+    """Decode the escapes of a scanned JSON string body"""
+    if "\\" not in raw:
+        return raw
+    try:
+        return json.loads('"' + raw + '"')
+    except ValueError:
+        return raw
+
+
+class MetaView:
+    """
+    A meta line only decoded as far as something needs it.
+    meta.name is scanned out of the raw string so prefix filtering happens without a parse,
+    the full json.loads and flatten run on first use of decoded/fields.
+    """
+
+    __slots__ = ("message", "_head", "_decoded", "_fields")
+
+    def __init__(self, message):
+        self.message = message
+        self._head = False
+        self._decoded = False
+        self._fields = None
+
+    def head(self):
+        """Flat part of the meta object, None when the line won't decode anyway or it's ambiguous"""
+        if self._head is False:
+            self._head = None
+            # A "meta" key in the params or message could be scanned instead of the top level one
+            if self.message.count('"meta"') == 1 and not any([x in self.message for x in g.BROKEN_MSGS]):
+                result = META_HEAD_REGEX.search(self.message)
+                if result:
+                    self._head = result.group(1)
+        return self._head
+
+    @property
+    def name(self):
+        """meta.name, or None when it can't be scanned"""
+        head = self.head()
+        result = NAME_REGEX.search(head) if head else None
+        return json_string(result.group(1)) if result else None
+
+    @property
+    def decoded(self):
+        """extract_meta of the line"""
+        if self._decoded is False:
+            self._decoded = extract_meta(self.message)
+        return self._decoded
+
+    @property
+    def fields(self):
+        """(name, flattened keys) or None when it isn't a meta line"""
+        if self._fields is None and self.decoded:
+            msg, obj, error, name = self.decoded
+            self._fields = name, meta_fields(obj, error)[0]
+        return self._fields
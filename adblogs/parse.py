@@ -0,0 +1,206 @@
+import time as _time
+
+# Number of lines looked at when sniffing the format of a stream
+SNIFF_LINES = 50
+
+# Format detected per stream (buffer)
+STREAM_FORMATS = {}
+
+
+def split_timestamp(line):
+    """
+    Split the leading timestamp off a line.
+    Handles MM-DD, YYYY-MM-DD and epoch seconds, with any sub second precision.
+    The time keeps its fraction, display trims it.
+    :return: (date, time, rest) or None
+    """
+    if line[2:3] == "-" and line[8:9] == ":":
+        # 01-15 10:22:33.123
+        date = line[0:5]
+        end = line.find(" ", 14)
+        time = line[6:end]
+    elif line[4:5] == "-" and line[13:14] == ":":
+        # 2024-01-15 10:22:33.123
+        date = line[0:10]
+        end = line.find(" ", 19)
+        time = line[11:end]
+    else:
+        # 1705312953.123
+        stripped = line.lstrip()
+        secs, dot, rest = stripped.partition(".")
+        if not dot or not secs.isdigit():
+            return None
+        end = rest.find(" ")
+        if end == -1:
+            return None
+        local = _time.localtime(int(secs))
+        time = _time.strftime("%H:%M:%S", local) + "." + rest[:end]
+        return _time.strftime("%m-%d", local), time, rest[end:]
+    if end == -1:
+        return None
+    return date, time, line[end:]
+
+
+def parse_threadtime(line):
+    """01-15 10:22:33.123  1234  1235 D Tag: message"""
+    stamp = split_timestamp(line)
+    if not stamp:
+        return None
+    fields = stamp[2].split(None, 3)
+    if len(fields) != 4 or len(fields[2]) != 1 or not fields[1].isdigit():
+        return None
+    tag, sep, message = fields[3].partition(":")
+    if not sep:
+        return None
+    return (
+        stamp[0], stamp[1], fields[0], fields[1], fields[2],
+        tag.strip().replace(" ", "_"), message.strip(),
+    )
+
+
+def parse_uid(line):
+    """01-15 10:22:33.123  1000  1234  1235 D Tag: message"""
+    stamp = split_timestamp(line)
+    if not stamp:
+        return None
+    fields = stamp[2].split(None, 4)
+    if len(fields) != 5 or len(fields[3]) != 1 or not fields[2].isdigit():
+        return None
+    tag, sep, message = fields[4].partition(":")
+    if not sep:
+        return None
+    return (
+        stamp[0], stamp[1], fields[1], fields[2], fields[3],
+        tag.strip().replace(" ", "_"), message.strip(),
+    )
+
+
+def parse_brief_body(body, date=None, time=None):
+    """D/Tag( 1234): message"""
+    body = body.lstrip()
+    if body[1:2] != "/":
+        return None
+    end = body.find("): ")
+    if end == -1:
+        if not body.endswith(")"):
+            return None
+        end = len(body) - 1
+    start = body.rfind("(", 0, end)
+    if start == -1:
+        return None
+    # With the uid modifier the pid is written as ( uid: pid)
+    pid = body[start + 1: end].rpartition(":")[2].strip()
+    return (
+        date, time, pid, None, body[0],
+        body[2:start].strip().replace(" ", "_"), body[end + 3:].strip(),
+    )
+
+
+def parse_time(line):
+    """01-15 10:22:33.123 D/Tag( 1234): message"""
+    stamp = split_timestamp(line)
+    if not stamp:
+        return None
+    return parse_brief_body(stamp[2], stamp[0], stamp[1])
+
+
+def parse_brief(line):
+    return parse_brief_body(line)
+
+
+class LongParser:
+    """
+    [ 01-15 10:22:33.123  1234: 1235 D/Tag ]
+    message lines...
+    Header lines return an empty message, following lines get the header's fields.
+    """
+
+    def __init__(self):
+        self.header = None
+
+    def __call__(self, line):
+        if line.startswith("[ ") and line.endswith("]"):
+            stamp = split_timestamp(line[2:])
+            if stamp:
+                fields = stamp[2].replace(":", " ").split(None, 2)
+                if len(fields) == 3 and fields[2][1:2] == "/":
+                    tag = fields[2][2:-1].strip().replace(" ", "_")
+                    self.header = (stamp[0], stamp[1], fields[0], fields[1], fields[2][0], tag)
+                    return self.header + ("",)
+        if not self.header:
+            return None
+        return self.header + (line.strip(),)
+
+
+FORMATS = {
+    "threadtime": parse_threadtime,
+    "uid": parse_uid,
+    "time": parse_time,
+    "brief": parse_brief,
+    "long": LongParser,
+}
+
+
+def get_parser(fmt):
+    parser = FORMATS[fmt]
+    # Stateful parsers are classes and need their own instance per stream
+    return parser() if isinstance(parser, type) else parser
+
+
+def detect_format(lines):
+    """
+    Sniff the logcat format from a sample of lines.
+    :return: The FORMATS key matching the most lines, or None
+    """
+    sample = [x for x in lines if not x.startswith("--------- ")][:SNIFF_LINES]
+    best = None
+    best_count = 0
+    for fmt in FORMATS:
+        parser = get_parser(fmt)
+        count = sum(1 for x in sample if parser(x))
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+
+def fresh_formats():
+    """STREAM_FORMATS with new instances of the stateful parsers, for parsing off the main loop"""
+    return {
+        stream: type(parser)() if type(parser) in FORMATS.values() else parser
+        for stream, parser in STREAM_FORMATS.items()
+    }
+
+
+def parse_batch(lines, stream=None, fmt=None, formats=None):
+    """
+    Extract the fields for a whole block of lines with the parser for the stream's format.
+    The format is detected from the first lines of the stream unless given.
+    :param formats: Parser per stream to use instead of STREAM_FORMATS
+    :return: Column lists (dates, times, pids, tids, levels, prefixes, messages),
+             None in every column for lines the parser can't handle
+    """
+    if formats is None:
+        formats = STREAM_FORMATS
+    if stream not in formats:
+        fmt = fmt or detect_format(lines)
+        if fmt:
+            formats[stream] = get_parser(fmt)
+    parser = formats.get(stream)
+    dates = []
+    times = []
+    pids = []
+    tids = []
+    levels = []
+    prefixes = []
+    messages = []
+    empty = (None,) * 7
+    for line in lines:
+        date, time, pid, tid, level, prefix, message = (parser and parser(line)) or empty
+        dates.append(date)
+        times.append(time)
+        pids.append(pid)
+        tids.append(tid)
+        levels.append(level)
+        prefixes.append(prefix)
+        messages.append(message)
+    return dates, times, pids, tids, levels, prefixes, messages
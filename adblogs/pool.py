@@ -0,0 +1,107 @@
+import multiprocessing
+import threading
+from collections import deque
+
+import adblogs._globals as g
+from adblogs.assemble import Assembler, idle_batches, parsed_batches
+from adblogs.capture import Capture
+from adblogs.filters import FilterWatcher, apply_filters, filter_config_file
+from adblogs.line import render_batch, output_line, swap_args
+from adblogs.sinks import NdjsonSink, record_batch
+
+# Batches rendering at once per worker before the reader waits
+MAX_IN_FLIGHT_PER_WORKER = 4
+POLL_SECS = 0.05
+
+WORKER_LARGS = None
+WORKER_FILTERS_VERSION = 0
+
+
+def init_worker(largs):
+    global WORKER_LARGS
+    WORKER_LARGS = largs
+
+
+def render_job(seq, buffer, lines, columns, filters_version, filters):
+    global WORKER_LARGS, WORKER_FILTERS_VERSION
+    if filters_version != WORKER_FILTERS_VERSION:
+        WORKER_LARGS = apply_filters(WORKER_LARGS, filters)
+        WORKER_FILTERS_VERSION = filters_version
+    unparsed = g.UNPARSED_LINES
+    rendered = []
+    records = []
+    if not WORKER_LARGS.no_term:
+        rendered = render_batch(lines, WORKER_LARGS, buffer, columns)
+    if WORKER_LARGS.ndjson:
+        records = record_batch(lines, WORKER_LARGS, buffer, columns)
+    return seq, rendered, records, g.UNPARSED_LINES - unparsed
+
+
+def pool_context():
+    """
+    Workers aren't forked from this process, by now it has the key listener, reader and adb threads
+    and a fork could inherit one of their locks held. forkserver forks from a clean process, spawn where it's missing.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def pool_loop(largs, batches):
+    """
+    Render batches on largs.workers processes.
+    Batches are parsed and assembled here as assembly needs every line in order,
+    then sequence numbered and results are held in a reorder buffer
+    so printing, line numbers and LINE_BUFFER keep the original order.
+    Each job carries the filters and their version so reloads reach every worker.
+    """
+    max_in_flight = largs.workers * MAX_IN_FLIGHT_PER_WORKER
+    batches = idle_batches(batches, POLL_SECS)
+    assembler = None if largs.no_assemble else Assembler()
+    capture = Capture(largs) if largs.trigger else None
+    in_flight = deque()
+    reorder = {}
+    next_seq = 0
+    seq = 0
+    sink = NdjsonSink(largs.ndjson) if largs.ndjson else None
+    watcher = FilterWatcher(filter_config_file(largs))
+    filters_version = 0
+
+    def on_result(result):
+        reorder[result[0]] = result
+
+    with pool_context().Pool(largs.workers, initializer=init_worker, initargs=(largs,)) as pool:
+        while True:
+            if g.pause_logging:
+                threading.Event().wait(POLL_SECS)
+                continue
+            while next_seq in reorder:
+                _, rendered, records, unparsed = reorder.pop(next_seq)
+                in_flight.popleft()
+                g.UNPARSED_LINES += unparsed
+                for line, error, search_content in rendered:
+                    output_line(line, error, search_content, largs)
+                if sink:
+                    sink.write(records)
+                next_seq += 1
+            if in_flight and in_flight[0].ready() and not in_flight[0].successful():
+                # Raise the worker's exception
+                in_flight[0].get()
+            if len(in_flight) >= max_in_flight:
+                in_flight[0].wait(POLL_SECS)
+                continue
+            filters = watcher.poll(largs.filters)
+            if filters:
+                largs = swap_args(apply_filters(largs, filters))
+                filters_version += 1
+            for buffer, lines, columns in parsed_batches(
+                next(batches), assembler, largs.format, capture
+            ):
+                in_flight.append(
+                    pool.apply_async(
+                        render_job,
+                        (seq, buffer, lines, columns, filters_version, largs.filters),
+                        callback=on_result,
+                    )
+                )
+                seq += 1
@@ -0,0 +1,297 @@
+import re
+
+import adblogs._globals as g
+from adblogs.meta import MetaView
+
+# Rough relative cost of evaluating a predicate on each field
+FIELD_COSTS = {
+    "level": 1,
+    "tag": 1,
+    "buffer": 1,
+    "pid": 1,
+    "msg": 4,
+    "name": 8,
+    "meta": 16,
+}
+
+# Evaluations between re-ordering the children of an and/or by observed selectivity
+REPLAN_EVERY = 1000
+
+TOKEN_REGEX = re.compile(
+    r"""\s*(?:
+    (?P<lparen>\()
+    |(?P<rparen>\))
+    |(?P<and>&&?|\band\b)
+    |(?P<or>\|\|?|\bor\b)
+    |(?P<not>!(?![=~])|\bnot\b)
+    |(?P<field>[A-Za-z_][\w.]*)\s*(?P<op>>=|<=|!=|!~|=|~|>|<)\s*
+     (?P<value>"(?:[^"\\]|\\.)*"|[^\s()&|"][^\s()&|]*)
+    )""",
+    re.VERBOSE,
+)
+
+
+class QueryRecord:
+    """The fields a query can look at, meta is only decoded if a predicate needs it"""
+
+    __slots__ = ("level", "tag", "msg", "buffer", "pid", "_view")
+
+    def __init__(self, level, tag, msg, buffer=None, pid=None):
+        self.level = level
+        self.tag = tag
+        self.msg = msg
+        self.buffer = buffer
+        self.pid = pid
+        self._view = False
+
+    @property
+    def view(self):
+        """MetaView or None when it isn't a meta line"""
+        if self._view is False:
+            self._view = MetaView(self.msg) if "\"meta\"" in self.msg else None
+        return self._view
+
+
+class Node:
+    """Plan node, keeps count of how often it's evaluated and passes"""
+
+    cost = 1
+
+    def __init__(self):
+        self.evals = 0
+        self.passes = 0
+
+    def pass_rate(self):
+        # Prior of a coin flip until it has been seen a few times
+        return (self.passes + 1) / (self.evals + 2)
+
+    def __call__(self, record):
+        self.evals += 1
+        result = self.test(record)
+        if result:
+            self.passes += 1
+        return result
+
+
+class Predicate(Node):
+    def __init__(self, field, op, value):
+        super().__init__()
+        self.field = field
+        self.op = op
+        self.cost = FIELD_COSTS["meta" if field.startswith("meta.") else field]
+        self.test = self.compile(value)
+
+    def get(self, record):
+        if self.field == "name":
+            view = record.view
+            if not view:
+                return None
+            name = view.name
+            if name is not None:
+                return name
+            return view.fields[0] if view.fields else None
+        if self.field.startswith("meta."):
+            fields = record.view.fields if record.view else None
+            if not fields:
+                return None
+            val = fields[1].get(self.field[5:])
+            return None if val is None else str(val)
+        return getattr(record, self.field)
+
+    def compile(self, value):
+        op = self.op
+        get = self.get
+        if op in ("=", "!="):
+            # Interned set membership
+            values = value.split(",")
+            if self.field == "level":
+                values = [x.upper() for x in values]
+            values = frozenset(values)
+            if op == "=":
+                return lambda record: get(record) in values
+            return lambda record: get(record) not in values
+        if op in ("~", "!~"):
+            # One automaton for all the alternatives
+            regex = re.compile("|".join([re.escape(x) for x in value.split(",")]), re.IGNORECASE)
+            if op == "~":
+                return lambda record: bool(regex.search(get(record) or ""))
+            return lambda record: not regex.search(get(record) or "")
+        if self.field == "level":
+            order = g.LEVEL_ORDER
+            if value.upper() not in order:
+                raise ValueError(f"Unknown level in query: {value}")
+            bound = order[value.upper()]
+            compare = COMPARES[op]
+            return lambda record: compare(order.get(record.level, 0), bound)
+        try:
+            bound = float(value)
+        except ValueError:
+            raise ValueError(f"{op} needs a level or a number: {value}")
+        compare = COMPARES[op]
+
+        def test(record):
+            try:
+                return compare(float(get(record)), bound)
+            except (TypeError, ValueError):
+                return False
+
+        return test
+
+
+COMPARES = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+}
+
+
+class Not(Node):
+    def __init__(self, child):
+        super().__init__()
+        self.child = child
+        self.cost = child.cost
+
+    def test(self, record):
+        return not self.child(record)
+
+
+class Combine(Node):
+    """
+    And/or over children, evaluated cheapest and most likely to short circuit first.
+    The order starts from the field costs and adapts to the observed pass rates.
+    """
+
+    def __init__(self, children):
+        super().__init__()
+        self.children = children
+        self.cost = sum([x.cost for x in children])
+        self.replan()
+
+    def replan(self):
+        self.children.sort(key=self.rank)
+        for child in self.children:
+            if isinstance(child, Combine):
+                child.replan()
+
+    def __call__(self, record):
+        if self.evals and self.evals % REPLAN_EVERY == 0:
+            self.replan()
+        return super().__call__(record)
+
+
+class All(Combine):
+    @staticmethod
+    def rank(node):
+        # Expected cost per line rejected
+        return node.cost / max(1 - node.pass_rate(), 0.01)
+
+    def test(self, record):
+        for child in self.children:
+            if not child(record):
+                return False
+        return True
+
+
+class Any(Combine):
+    @staticmethod
+    def rank(node):
+        # Expected cost per line accepted
+        return node.cost / max(node.pass_rate(), 0.01)
+
+    def test(self, record):
+        for child in self.children:
+            if child(record):
+                return True
+        return False
+
+
+def tokenize(query):
+    tokens = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        match = TOKEN_REGEX.match(query, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Bad query at: {query[pos:]}")
+        pos = match.end()
+        kind = match.lastgroup if match.lastgroup != "value" else "pred"
+        if kind == "pred":
+            value = match.group("value")
+            if value.startswith('"'):
+                value = re.sub(r"\\(.)", r"\1", value[1:-1])
+            field = match.group("field")
+            if field not in FIELD_COSTS and not field.startswith("meta."):
+                raise ValueError(f"Unknown field in query: {field}")
+            tokens.append(("pred", (field, match.group("op"), value)))
+        else:
+            tokens.append((kind, None))
+    return tokens
+
+
+def compile_query(query):
+    """
+    Compile a boolean query over record fields into an evaluation plan.
+
+        (tag=vivi,Foo & level>=W | meta.params.x=2) & !msg~"zombie chromium"
+
+    fields: level tag buffer pid msg name (meta name) meta.<flattened key>
+    ops: = != (comma separated values match any) ~ !~ (case insensitive contains)
+         >= <= > < (level, or numbers)
+    & binds tighter than |, ! negates, and/or/not work too.
+    :return: Plan callable on a QueryRecord
+    :raises ValueError: On a query that doesn't parse
+    """
+    tokens = tokenize(query)
+    pos = 0
+
+    def peek():
+        return tokens[pos][0] if pos < len(tokens) else None
+
+    def parse_or():
+        nonlocal pos
+        children = [parse_and()]
+        while peek() == "or":
+            pos += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else Any(children)
+
+    def parse_and():
+        nonlocal pos
+        children = [parse_not()]
+        while peek() == "and":
+            pos += 1
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else All(children)
+
+    def parse_not():
+        nonlocal pos
+        kind = peek()
+        if kind == "not":
+            pos += 1
+            return Not(parse_not())
+        if kind == "lparen":
+            pos += 1
+            node = parse_or()
+            if peek() != "rparen":
+                raise ValueError("Missing ) in query")
+            pos += 1
+            return node
+        if kind == "pred":
+            pos += 1
+            return Predicate(*tokens[pos - 1][1])
+        raise ValueError(f"Unexpected {kind or 'end'} in query")
+
+    plan = parse_or()
+    if pos != len(tokens):
+        raise ValueError(f"Unexpected {tokens[pos][0]} in query")
+    return plan
+
+
+def query_match(level, prefix, message, largs, buffer=None, pid=None):
+    if not largs.query:
+        return True
+    plan = largs.__dict__.get("query_plan")
+    if plan is None:
+        plan = largs.query_plan = compile_query(largs.query)
+    return plan(QueryRecord(level, prefix, message, buffer, pid))
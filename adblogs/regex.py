@@ -6,8 +6,8 @@ r_date = r"(?P<date>\d\d-\d\d)"
 r_time = r"(?P<time>\d\d:\d\d:\d\d.\d\d\d)"
 r_pid = r"(\d+)"
 r_level = r"(?P<level>.)"
-# This needs to be greedy
-r_prefix = r"(?P<prefix>.*?\s*:)"
+# Up to the first colon
+r_prefix = r"(?P<prefix>[^:]*:)"
 r_message = r"(?P<message>.*)"
 # Get last occurance
 r_json = r"(?P<pre_json>.*)(?P<json>^\{.*\}$)(?P<post_json>.*)"
@@ -21,4 +21,16 @@ json_regex = re.compile(r_json)
 
 # meta
 r_meta_line = r".*\"meta\":.*(?P<level>INFO|DEBUG|WARN|ERROR) (?P<name>.*): (?P<message>.*) (?P<json>\{.*)$"
-meta_regex = re.compile(r_meta_line)
\ No newline at end of file
+meta_regex = re.compile(r_meta_line)
+
+
+# stack traces
+# Lines carrying on a trace: java/js frames, causes, elided frames and the thrown class
+r_continuation = (
+    r"(?:at |Caused by: |Suppressed: |\.\.\. \d+ more|Process: \S+, PID: \d+"
+    r"|[\w$]+(?:\.[\w$]+)+(?:Exception|Error)\b)"
+)
+continuation_regex = re.compile(r_continuation)
+# Lines a trace can start from
+r_trace_head = r".*(?:Exception|Error|FATAL)"
+trace_head_regex = re.compile(r_trace_head)
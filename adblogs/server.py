@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import json
+import socket
+import sys
+import threading
+from pathlib import Path
+
+import adblogs._globals as g
+from adblogs.adb import adb_clear, adb_logs
+from adblogs.assemble import Assembler, idle_batches, parsed_batches
+from adblogs.budget import BudgetQueue, register, unregister
+from adblogs.capture import Capture
+from adblogs.filters import FILTER_KEYS, apply_filters, compile_filters, filters_dict
+from adblogs.line import output_line, render_batch
+from adblogs.sinks import NdjsonSink, record_batch
+
+POLL_SECS = 0.05
+# Seconds a client gets to send its filters before it's dropped
+HANDSHAKE_SECS = 5
+
+# Per process state that shouldn't be sent to the server
+SUBSCRIBER_SKIP_KEYS = [
+    "template",
+    "keep_prefix_cache",
+    "query_plan",
+    "log_history_dir",
+    "log_history_file",
+    "ndjson",
+    "filters",
+]
+
+# Rendering flags a client can set besides its filters, everything else stays the server's
+SUBSCRIBER_RENDER_KEYS = ["raw", "no_current_time", "find_case_sensitive", "meta_only"]
+
+
+def socket_path(largs):
+    if largs.socket:
+        return Path(largs.socket)
+    return Path(largs.log_history_dir) / f"adblogs-{largs.ip or 'usb'}.sock"
+
+
+class Subscriber:
+    """
+    A connected client with its own filters.
+    Rendered batches go through a queue bounded by CLIENT_QUEUE_BYTES so a slow client only drops its own lines.
+    """
+
+    ids = itertools.count()
+
+    def __init__(self, conn, largs):
+        self.conn = conn
+        self.largs = largs
+        self.name = f"CLIENT_QUEUE {next(self.ids)}"
+        self.queue = register(self.name, BudgetQueue(g.CLIENT_QUEUE_BYTES))
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.closed = False
+
+    def publish(self, rendered):
+        if not self.queue.put(rendered, block=False):
+            self.dropped += len(rendered)
+
+    def send(self, msg):
+        self.conn.sendall((json.dumps(msg) + "\n").encode())
+
+    def write_loop(self):
+        try:
+            while True:
+                rendered = self.queue.get()
+                if self.dropped != self.reported_dropped:
+                    self.reported_dropped = self.dropped
+                    self.send({"dropped": self.dropped})
+                self.conn.sendall(
+                    "".join(
+                        [
+                            json.dumps({"line": line, "error": error, "find": search_content}) + "\n"
+                            for line, error, search_content in rendered
+                        ]
+                    ).encode()
+                )
+        except OSError:
+            pass
+        self.closed = True
+        unregister(self.name)
+        self.conn.close()
+
+
+def subscriber_largs(conn_file, server_largs):
+    """
+    Filters the client sent, on top of the server's args.
+    Only FILTER_KEYS and SUBSCRIBER_RENDER_KEYS are taken, compiled the way a config file is
+    so a bad client can't break rendering for the others.
+    :raises ValueError: On a message that isn't a JSON object or has bad values
+    """
+    msg = json.loads(conn_file.readline())
+    if not isinstance(msg, dict):
+        raise ValueError("Client filters should be a JSON object")
+    largs = argparse.Namespace(**vars(server_largs))
+    for key in SUBSCRIBER_SKIP_KEYS:
+        largs.__dict__.pop(key, None)
+    for key in SUBSCRIBER_RENDER_KEYS:
+        if key in msg:
+            if not isinstance(msg[key], bool):
+                raise ValueError(f"{key} should be true or false: {msg[key]!r}")
+            setattr(largs, key, msg[key])
+    values = filters_dict(server_largs.filters)
+    values.update({k: v for k, v in msg.items() if k in FILTER_KEYS})
+    return apply_filters(largs, compile_filters(values))
+
+
+def handshake(conn, subscribers, largs):
+    """Read a client's filters on its own thread, so a client that never sends them can't block the others"""
+    try:
+        conn.settimeout(HANDSHAKE_SECS)
+        sub_largs = subscriber_largs(conn.makefile("r"), largs)
+        conn.settimeout(None)
+    except (OSError, ValueError, TypeError):
+        conn.close()
+        return
+    subscriber = Subscriber(conn, sub_largs)
+    subscribers.append(subscriber)
+    print(f"Client connected ({len(subscribers)} total)", file=sys.stderr)
+    subscriber.write_loop()
+
+
+def accept_loop(server_sock, subscribers, largs):
+    while True:
+        conn, _ = server_sock.accept()
+        threading.Thread(target=handshake, args=(conn, subscribers, largs), daemon=True).start()
+
+
+def serve(largs):
+    """
+    Own the adb ingestion and parsing, render for every client with its own filters
+    and publish over a local unix socket.
+    """
+    path = socket_path(largs)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    server_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_sock.bind(str(path))
+    server_sock.listen()
+    print(f"Serving on {path}", file=sys.stderr)
+    subscribers = []
+    threading.Thread(
+        target=accept_loop, args=(server_sock, subscribers, largs), daemon=True
+    ).start()
+    if largs.adb_clear:
+        adb_clear()
+    sink = NdjsonSink(largs.ndjson) if largs.ndjson else None
+    assembler = None if largs.no_assemble else Assembler()
+    capture = Capture(largs) if largs.trigger else None
+    try:
+        for batch in idle_batches(adb_logs(largs.ip, largs.buffers, largs.log_history_dir)):
+            for buffer, lines, columns in parsed_batches(batch, assembler, largs.format, capture):
+                if sink:
+                    sink.write(record_batch(lines, largs, buffer, columns))
+                for subscriber in list(subscribers):
+                    if subscriber.closed:
+                        subscribers.remove(subscriber)
+                        print(f"Client disconnected ({len(subscribers)} total)", file=sys.stderr)
+                        continue
+                    rendered = render_batch(lines, subscriber.largs, buffer, columns)
+                    if rendered:
+                        subscriber.publish(rendered)
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def connect_loop(largs):
+    """Print the lines a server renders with our filters"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(str(socket_path(largs)))
+    filters = {
+        key: sorted(val) if isinstance(val, (set, frozenset)) else val
+        for key, val in vars(largs).items()
+        if key not in SUBSCRIBER_SKIP_KEYS
+    }
+    conn.sendall((json.dumps(filters) + "\n").encode())
+    conn_file = conn.makefile("r")
+    while True:
+        if g.pause_logging:
+            threading.Event().wait(POLL_SECS)
+            continue
+        msg = conn_file.readline()
+        if not msg:
+            print("Server closed the connection")
+            return
+        msg = json.loads(msg)
+        if "dropped" in msg:
+            print(f"Dropped {msg['dropped']} lines, reading too slow")
+            continue
+        output_line(msg["line"], msg["error"], msg["find"], largs)
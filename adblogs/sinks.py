@@ -0,0 +1,123 @@
+import json
+import sys
+import time as _time
+
+from adblogs.line import (
+    excluded_prefix,
+    excluded_value,
+    keep_record,
+    keep_unparsed,
+    meta_excluded,
+    meta_prefix,
+    regex_fields,
+)
+from adblogs.meta import MetaView, meta_fields
+from adblogs.parse import parse_batch
+from adblogs.query import query_match
+
+
+def record_line(date, time, pid, tid, level, prefix, message, largs, buffer=None):
+    """
+    One unstyled record, with the same filters as the terminal but nothing rendered.
+    :return: Record dict or None when filtered out
+    """
+    if not message or not keep_record(level, prefix, largs):
+        return None
+    if not query_match(level, prefix, message, largs, buffer, pid):
+        return None
+    msg = message
+    subprefix = None
+    keys = {}
+    error = ""
+    if "\"meta\"" in message:
+        view = MetaView(message)
+        if meta_excluded(prefix, view, largs):
+            return None
+        meta = view.decoded
+        if meta:
+            msg, obj, error, subprefix = meta
+            if largs.exclude_prefixes and subprefix in largs.exclude_prefixes:
+                return None
+            prefix = meta_prefix(prefix, subprefix, largs)
+            keys, error = meta_fields(obj, error)
+            keys = {
+                k: v
+                for k, v in keys.items()
+                if not (largs.show_keys and k not in largs.show_keys)
+                and not (largs.exclude_keys and k in largs.exclude_keys)
+            }
+    if excluded_prefix(prefix, largs) or excluded_value(msg, largs):
+        return None
+    if largs.filter and not any([filter_word in message for filter_word in largs.filter]):
+        return None
+    return {
+        "device_time": f"{date} {time}" if date else time,
+        "host_time": _time.time(),
+        "buffer": buffer,
+        "pid": pid,
+        "tid": tid,
+        "level": level,
+        "tag": prefix,
+        "subprefix": subprefix,
+        "message": msg.strip(),
+        "keys": keys,
+        "error": error or None,
+    }
+
+
+def record_unparsed(line, largs, buffer=None):
+    """A line no parser understood as a record with only the message set, None when filtered out"""
+    if not keep_unparsed(line, largs, buffer):
+        return None
+    if largs.filter and not any([filter_word in line for filter_word in largs.filter]):
+        return None
+    return {
+        "device_time": None,
+        "host_time": _time.time(),
+        "buffer": buffer,
+        "pid": None,
+        "tid": None,
+        "level": None,
+        "tag": None,
+        "subprefix": None,
+        "message": line.strip(),
+        "keys": {},
+        "error": None,
+    }
+
+
+def record_batch(lines, largs, buffer=None, columns=None):
+    """Unstyled counterpart of line.render_batch"""
+    records = []
+    if columns is None:
+        columns = parse_batch(lines, buffer, largs.format)
+    dates, times, pids, tids, levels, prefixes, messages = columns
+    for i, prefix in enumerate(prefixes):
+        if prefix is None:
+            if lines[i].startswith("--------- "):
+                continue
+            fields = regex_fields(lines[i])
+            if fields:
+                date, time, level, prefix, message = fields
+                record = record_line(date, time, None, None, level, prefix, message, largs, buffer)
+            else:
+                record = record_unparsed(lines[i], largs, buffer)
+        else:
+            record = record_line(
+                dates[i], times[i], pids[i], tids[i], levels[i], prefix, messages[i], largs, buffer
+            )
+        if record:
+            records.append(record)
+    return records
+
+
+class NdjsonSink:
+    """One JSON object per record, each batch of records is a single write"""
+
+    def __init__(self, path):
+        self.file = sys.stdout if path == "-" else open(path, "a", buffering=1024 * 64)
+
+    def write(self, records):
+        if records:
+            self.file.write("".join([json.dumps(x, default=str) + "\n" for x in records]))
+            self.file.flush()
@@ -0,0 +1,158 @@
+import calendar
+import re
+import time as _time
+from bisect import bisect_left, bisect_right
+
+from adblogs.budget import ENTRY_OVERHEAD, entry_size
+
+DAY_SECS = 24 * 60 * 60
+
+# Buffers interleave this far out of order, a bigger jump back is a replay (adb restart, event ring dump)
+MAX_SKEW_SECS = 5
+
+SEEK_REGEX = re.compile(r"^\s*(?:(?P<date>(?:\d{4}-)?\d\d-\d\d)\s+)?(?P<time>\d\d?:\d\d(?::\d\d)?)\s*$")
+
+
+def time_secs(time):
+    """HH:MM:SS (or HH:MM) as seconds into the day"""
+    parts = time.split(":")
+    return int(parts[0]) * 3600 + int(parts[1]) * 60 + (int(parts[2][:2]) if len(parts) > 2 else 0)
+
+
+def day_start(date, ref=None):
+    """
+    Epoch seconds of midnight on a device date.
+    MM-DD has no year so the year putting it closest to ref is used, which carries over new year.
+    """
+    if ref is None:
+        ref = calendar.timegm(_time.localtime())
+    if len(date) == 10:
+        return calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]), 0, 0, 0))
+    month, day = int(date[0:2]), int(date[3:5])
+    year = _time.gmtime(ref).tm_year
+    candidates = [calendar.timegm((y, month, day, 0, 0, 0)) for y in (year - 1, year, year + 1)]
+    return min(candidates, key=lambda x: abs(x - ref))
+
+
+def device_seconds(date, time, ref=None):
+    """
+    Seconds for a device timestamp, comparable across the whole run.
+    A bare time takes the day putting it closest to ref, which carries over midnight.
+    """
+    secs = time_secs(time)
+    if date:
+        return day_start(date, ref) + secs
+    if ref is None:
+        ref = calendar.timegm(_time.localtime())
+    base = ref - ref % DAY_SECS
+    return min([base - DAY_SECS + secs, base + secs, base + DAY_SECS + secs], key=lambda x: abs(x - ref))
+
+
+class TimeIndex:
+    """
+    (buffer, line) entries with a device time, bounded by the approximate bytes of its lines.
+    Entries are kept in runs whose stamps never go backwards, so seeks and windows are a bisect per run.
+    Small skews are clamped onto the run, a jump back of more than MAX_SKEW_SECS starts a new run
+    so replayed lines keep their real time. Lines without a time (unparsed, brief format)
+    take the stamp before them.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.bytes = 0
+        self.stamps = []
+        self.entries = []
+        # Evicted entries are skipped by offset and compacted once they're half the lists
+        self.start = 0
+        # Where each run starts in the lists
+        self.runs = [0]
+        self.last = None
+        self.last_date = None
+        self.last_day = None
+
+    def __len__(self):
+        return len(self.entries) - self.start
+
+    def __iter__(self):
+        return iter(self.entries[self.start:])
+
+    def clear(self):
+        self.stamps.clear()
+        self.entries.clear()
+        self.start = 0
+        self.runs = [0]
+        self.bytes = 0
+
+    @staticmethod
+    def entry_size(line):
+        # The (buffer, line) tuple and the stamp on top of the line
+        return entry_size(line) + ENTRY_OVERHEAD
+
+    def stamp(self, date, time):
+        if not time:
+            return self.last or 0
+        if date:
+            if date != self.last_date:
+                self.last_date = date
+                self.last_day = day_start(date, self.last)
+            stamp = self.last_day + time_secs(time)
+        else:
+            stamp = device_seconds(None, time, self.last)
+        if self.last is not None and stamp < self.last:
+            if self.last - stamp > MAX_SKEW_SECS:
+                self.runs.append(len(self.stamps))
+            else:
+                # Buffers interleave slightly out of order, never let that break the bisect
+                stamp = self.last
+        self.last = stamp
+        return stamp
+
+    def extend(self, buffer, lines, dates=None, times=None):
+        for i, line in enumerate(lines):
+            self.stamps.append(self.stamp(dates[i] if dates else None, times[i] if times else None))
+            self.entries.append((buffer, line))
+            self.bytes += self.entry_size(line)
+        while self.bytes > self.budget and len(self.entries) - self.start > 1:
+            self.bytes -= self.entry_size(self.entries[self.start][1])
+            self.start += 1
+        if self.start > len(self.entries) // 2:
+            del self.stamps[: self.start]
+            del self.entries[: self.start]
+            runs = [x - self.start for x in self.runs]
+            # Runs evicted whole are dropped, the one holding the new start begins at 0
+            self.runs = [0] + [x for x in runs if x > 0]
+            self.start = 0
+
+    def resolve(self, date, time):
+        """Stamp of a device time the way it would have been indexed, None when empty"""
+        if self.last is None:
+            return None
+        return device_seconds(date, time, self.last)
+
+    def window(self, start, end):
+        """Entries with a stamp from start to end inclusive, in the order they were read"""
+        entries = []
+        run_ends = self.runs[1:] + [len(self.stamps)]
+        for run_start, run_end in zip(self.runs, run_ends):
+            if run_end <= self.start:
+                continue
+            lo = bisect_left(self.stamps, start, max(run_start, self.start), run_end)
+            hi = bisect_right(self.stamps, end, lo, run_end)
+            entries += self.entries[lo:hi]
+        return entries
+
+    def around(self, stamp, secs):
+        return self.window(stamp - secs, stamp + secs)
+
+    def seek(self, text, secs):
+        """
+        Entries within secs of a typed time, HH:MM[:SS] with an optional MM-DD or YYYY-MM-DD.
+        :raises ValueError: When the time can't be read
+        """
+        result = SEEK_REGEX.match(text)
+        if not result:
+            raise ValueError(f"Can't read a time from: {text}")
+        stamp = self.resolve(result.group("date"), result.group("time"))
+        if stamp is None:
+            return []
+        return self.around(stamp, secs)
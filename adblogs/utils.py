@@ -1,7 +1,6 @@
 import subprocess
 import sys
 from adblogs.colors import *
-from inputimeout import inputimeout, TimeoutOccurred
 
 
 def a_split(arg_val):
@@ -42,6 +41,7 @@ def flatten(dictionary, parent_key=False, separator="."):
 
 
 def check_continue(msg="", time_limit_secs=5):
+    from inputimeout import inputimeout, TimeoutOccurred
 
     break_keys = ["b"]
     continue_keys = [" ", "c", "space"]
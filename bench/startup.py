@@ -0,0 +1,89 @@
+"""
+Startup benchmark.
+Times importing the adblogs modules and launching adblogs.py against a fake adb
+until the first log line is printed, failing if that takes longer than the target.
+
+python bench/startup.py --target 1.0
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = [
+    "adblogs.arguments",
+    "adblogs.line",
+    "adblogs.adb",
+    "adblogs.history",
+]
+
+FAKE_ADB = """#!/bin/sh
+echo "01-15 10:22:33.123  1234  1235 I bench   : first line"
+sleep 5
+"""
+
+
+def import_time(module, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True)
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best
+
+
+def first_line_time(tmp_dir):
+    bin_dir = Path(tmp_dir) / "bin"
+    bin_dir.mkdir()
+    fake_adb = bin_dir / "adb"
+    fake_adb.write_text(FAKE_ADB)
+    fake_adb.chmod(0o755)
+    env = dict(os.environ)
+    env["PATH"] = str(bin_dir) + os.pathsep + env["PATH"]
+    env["PYTHONUNBUFFERED"] = "1"
+    start = time.perf_counter()
+    ps = subprocess.Popen(
+        [sys.executable, "adblogs.py", "--log-history-dir", str(Path(tmp_dir) / "history")],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        for line in ps.stdout:
+            if b"first line" in line:
+                return time.perf_counter() - start
+    finally:
+        ps.kill()
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="startup benchmark")
+    parser.add_argument("--target", help="TargetFirstLineSecs", type=float, default=1.0)
+    parser.add_argument("--runs", help="ImportRuns", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = import_time("sys", args.runs)
+    for module in MODULES:
+        took = import_time(module, args.runs)
+        print(f"import {module}: {(took - baseline) * 1000:.1f}ms")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        took = first_line_time(tmp_dir)
+    if took is None:
+        print("first line: never printed")
+        sys.exit(1)
+    print(f"first line: {took * 1000:.1f}ms (target {args.target * 1000:.0f}ms)")
+    if took > args.target:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import json
+import sys
+
+import pytest
+
+from adblogs.arguments import log_args
+
+
+def parse(monkeypatch, tmp_path, *argv):
+    monkeypatch.setattr(sys, "argv", ["adblogs", "--log-history-dir", str(tmp_path), *argv])
+    return log_args()
+
+
+def write_config(path):
+    path.write_text(json.dumps({"show_prefixes": ["Old"], "level": "E", "find": []}))
+
+
+def test_saved_default_config_doesnt_override_flags(monkeypatch, tmp_path):
+    write_config(tmp_path / "filters.json")
+    largs = parse(monkeypatch, tmp_path, "--fp", "New", "-l", "V", "-f", "boom")
+    assert largs.show_prefixes == {"New"}
+    assert largs.level == "V"
+    assert "boom" in largs.find
+
+
+def test_explicit_config_applies_at_startup(monkeypatch, tmp_path):
+    config = tmp_path / "mine.json"
+    write_config(config)
+    largs = parse(monkeypatch, tmp_path, "--config", str(config), "--fp", "New")
+    assert largs.show_prefixes == {"Old"}
+    assert largs.level == "E"
+    assert largs.find == []
+
+
+def test_bad_query_exits(monkeypatch, tmp_path):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, tmp_path, "-q", "tag=(")
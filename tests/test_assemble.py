@@ -0,0 +1,125 @@
+import pytest
+
+from adblogs import assemble
+from adblogs.assemble import Assembler, assemble_all
+from adblogs.parse import parse_batch
+
+
+def line(msg, level="E", tag="Foo", pid="123", tid="123"):
+    return f"01-15 10:00:00.000  {pid}  {tid} {level} {tag}: {msg}"
+
+
+def feed(assembler, lines, buffer="main"):
+    columns = parse_batch(lines, buffer, "threadtime", {})
+    return assembler.feed(buffer, lines, columns)
+
+
+def messages(batches):
+    return [x for _, _, columns in batches for x in columns[6]]
+
+
+TRACE = [
+    line("FATAL EXCEPTION: main"),
+    line("java.lang.IllegalStateException: boom"),
+    line("\tat com.foo.Bar.baz(Bar.java:10)"),
+    line("Caused by: java.io.IOException: nope"),
+    line("\t... 3 more"),
+]
+
+
+def test_trace_becomes_one_record():
+    batches = assemble_all([("main", TRACE, parse_batch(TRACE, "main", "threadtime", {}))])
+    assert len(messages(batches)) == 1
+    assert messages(batches)[0].split("\n\t") == [
+        "FATAL EXCEPTION: main",
+        "java.lang.IllegalStateException: boom",
+        "at com.foo.Bar.baz(Bar.java:10)",
+        "Caused by: java.io.IOException: nope",
+        "... 3 more",
+    ]
+    assert batches[0][1] == ["\n".join(TRACE)]
+
+
+def test_lines_after_an_open_record_wait_for_it():
+    assembler = Assembler()
+    assert feed(assembler, [TRACE[0], line("hello", "I", "Other", "9", "9")]) == []
+    batches = assembler.flush()
+    assert messages(batches) == ["FATAL EXCEPTION: main", "hello"]
+
+
+def test_closed_on_lookahead(monkeypatch):
+    monkeypatch.setattr(assemble, "ASSEMBLE_LOOKAHEAD", 3)
+    assembler = Assembler()
+    feed(assembler, [TRACE[0]])
+    others = [line(f"other {i}", "I", "Other", "9", "9") for i in range(3)]
+    assert feed(assembler, others) == []
+    batches = feed(assembler, [line("other 3", "I", "Other", "9", "9")])
+    assert messages(batches)[0] == "FATAL EXCEPTION: main"
+    # A continuation after the record was closed starts its own
+    feed(assembler, [TRACE[2]])
+    assert messages(assembler.flush()) == ["at com.foo.Bar.baz(Bar.java:10)"]
+
+
+def test_closed_on_timeout(monkeypatch):
+    assembler = Assembler()
+    feed(assembler, TRACE[:2])
+    assert assembler.expire() == []
+    monkeypatch.setattr(assemble, "ASSEMBLE_TIMEOUT", -1)
+    assert len(messages(assembler.expire())) == 1
+
+
+def test_cut_at_max_lines(monkeypatch):
+    monkeypatch.setattr(assemble, "ASSEMBLE_MAX_LINES", 3)
+    batches = assemble_all([("main", TRACE, parse_batch(TRACE, "main", "threadtime", {}))])
+    # The rest carries on in a new record
+    assert [len(x.split("\n\t")) for x in messages(batches)] == [3, 2]
+
+
+def test_oldest_closed_past_max_open(monkeypatch):
+    monkeypatch.setattr(assemble, "ASSEMBLE_MAX_OPEN", 2)
+    assembler = Assembler()
+    heads = [line("java.lang.Error: boom", pid=str(i), tid=str(i)) for i in range(3)]
+    batches = feed(assembler, heads)
+    assert messages(batches) == ["java.lang.Error: boom"]
+    assert len(assembler.open) == 2
+    # The first one is closed so its frame stands alone
+    frame = line("\tat a.b(C.java:1)", pid="0", tid="0")
+    feed(assembler, [frame])
+    assert messages(assembler.flush())[-1] == "at a.b(C.java:1)"
+
+
+def test_front_closed_past_max_pending(monkeypatch):
+    monkeypatch.setattr(assemble, "ASSEMBLE_MAX_PENDING", 5)
+    monkeypatch.setattr(assemble, "ASSEMBLE_LOOKAHEAD", 100)
+    assembler = Assembler()
+    feed(assembler, [TRACE[0]])
+    others = [line(f"other {i}", "I", "Other", "9", "9") for i in range(5)]
+    batches = feed(assembler, others)
+    assert messages(batches)[:2] == ["FATAL EXCEPTION: main", "other 0"]
+
+
+def test_records_are_keyed_by_thread_and_tag():
+    lines = [
+        line("java.lang.Error: one", tid="1"),
+        line("java.lang.Error: two", tid="2"),
+        line("\tat one.frame(A.java:1)", tid="1"),
+        line("\tat two.frame(B.java:1)", tid="2"),
+    ]
+    batches = assemble_all([("main", lines, parse_batch(lines, "main", "threadtime", {}))])
+    assert messages(batches) == [
+        "java.lang.Error: one\n\tat one.frame(A.java:1)",
+        "java.lang.Error: two\n\tat two.frame(B.java:1)",
+    ]
+
+
+def test_plain_lines_and_meta_pass_straight_through():
+    lines = [line("hello", "I"), line('{"meta": {"name": "x"}, "message": "Error"}'), "unparsed"]
+    batches = feed(Assembler(), lines)
+    assert messages(batches) == ["hello", '{"meta": {"name": "x"}, "message": "Error"}', None]
+
+
+def test_batches_split_by_buffer():
+    assembler = Assembler()
+    feed(assembler, [line("a", "I")], "main")
+    batches = feed(assembler, [line("b", "I")], "crash") + feed(assembler, [line("c", "I")], "crash")
+    assert [x[0] for x in batches] == ["crash", "crash"]
@@ -0,0 +1,91 @@
+import pickle
+import queue
+import threading
+
+import pytest
+
+from adblogs.budget import (
+    ENTRY_OVERHEAD,
+    MEMORY_STATS,
+    BudgetCache,
+    BudgetDeque,
+    BudgetQueue,
+    entry_size,
+    memory_report,
+    register,
+    unregister,
+)
+
+
+def test_entry_size():
+    assert entry_size("abc") == 3 + ENTRY_OVERHEAD
+    assert entry_size(("main", ["ab", "cd"])) == 3 * ENTRY_OVERHEAD + 4 + 2 * (2 + ENTRY_OVERHEAD)
+    assert entry_size(None) == 0
+
+
+def test_deque_evicts_oldest_by_bytes():
+    deque = BudgetDeque(3 * (10 + ENTRY_OVERHEAD))
+    deque.extend(["a" * 10] * 3)
+    deque.append("b" * 10)
+    assert list(deque) == ["a" * 10] * 2 + ["b" * 10]
+    assert deque.bytes == 3 * (10 + ENTRY_OVERHEAD)
+    # The newest is kept however big
+    deque.append("c" * 1000)
+    assert list(deque) == ["c" * 1000]
+
+
+def test_cache_evicts_oldest_inserted():
+    cache = BudgetCache(2 * entry_size(("k0", "v")))
+    for i in range(3):
+        cache[f"k{i}"] = "v"
+    assert list(cache) == ["k1", "k2"]
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy == cache
+    assert copy.bytes == cache.bytes
+
+
+def test_queue_drops_past_budget_without_blocking():
+    batch = ("main", ["x" * 100])
+    budget_queue = BudgetQueue(2 * entry_size(batch))
+    assert budget_queue.put(batch, block=False)
+    assert budget_queue.put(batch, block=False)
+    assert not budget_queue.put(batch, block=False)
+    assert len(budget_queue) == 2
+    budget_queue.get()
+    assert budget_queue.bytes == entry_size(batch)
+
+
+def test_queue_takes_one_item_over_budget():
+    budget_queue = BudgetQueue(10)
+    assert budget_queue.put(("main", ["x" * 100]), block=False)
+    assert not budget_queue.put(("main", ["y"]), block=False)
+
+
+def test_queue_put_waits_for_room():
+    budget_queue = BudgetQueue(entry_size("a"))
+    budget_queue.put("a")
+    done = threading.Event()
+
+    def put():
+        budget_queue.put("b")
+        done.set()
+
+    threading.Thread(target=put, daemon=True).start()
+    assert not done.wait(0.1)
+    assert budget_queue.get() == "a"
+    assert done.wait(2)
+    assert budget_queue.get() == "b"
+
+
+def test_queue_get_timeout():
+    with pytest.raises(queue.Empty):
+        BudgetQueue(100).get(timeout=0.01)
+
+
+def test_registered_queue_in_report():
+    register("TEST_QUEUE", BudgetQueue(1024 * 1024)).put("a")
+    try:
+        assert any([x.startswith("TEST_QUEUE: 1 entries") for x in memory_report()])
+    finally:
+        unregister("TEST_QUEUE")
+    assert "TEST_QUEUE" not in MEMORY_STATS
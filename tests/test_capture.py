@@ -0,0 +1,72 @@
+import argparse
+import time
+
+import pytest
+
+import adblogs._globals as g
+from adblogs import parse
+from adblogs.assemble import parsed_batches
+from adblogs.capture import Capture
+from adblogs.timeline import TimeIndex
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(g, "RAW_BUFFER", TimeIndex(1024 * 1024))
+    monkeypatch.setattr(parse, "STREAM_FORMATS", {})
+
+
+def capture_largs(tmp_path, trigger, after=10):
+    return argparse.Namespace(
+        trigger=trigger,
+        capture_before=30,
+        capture_after=after,
+        capture_every=0,
+        capture_dir=str(tmp_path),
+        log_history_dir=str(tmp_path),
+    )
+
+
+def wait_for_capture(tmp_path):
+    for _ in range(100):
+        written = list(tmp_path.glob("capture-*.log"))
+        if written:
+            return written[0].read_text()
+        time.sleep(0.02)
+    raise AssertionError("no capture written")
+
+
+def test_trigger_without_device_time(tmp_path):
+    capture = Capture(capture_largs(tmp_path, "msg~boom"))
+    lines = ["I/Foo( 123): before", "E/Foo( 123): boom happened"]
+    parsed_batches(("main", lines), None, "brief", capture)
+    assert capture.pending.end_stamp is None
+    assert [x[1] for x in capture.pending.entries] == lines
+
+
+def test_unparsed_trigger_before_any_time(tmp_path):
+    capture = Capture(capture_largs(tmp_path, "msg~boom"))
+    parsed_batches(("main", ["boom, nothing parses me"]), None, "threadtime", capture)
+    assert capture.pending.entries == [("main", "boom, nothing parses me")]
+
+
+def test_capture_without_device_time_ends_on_host_time(tmp_path):
+    capture = Capture(capture_largs(tmp_path, "msg~boom", after=0))
+    parsed_batches(("main", ["E/Foo( 123): boom happened"]), None, "brief", capture)
+    assert capture.pending is None
+    assert "E/Foo( 123): boom happened" in wait_for_capture(tmp_path)
+
+
+def test_capture_window_by_device_time(tmp_path):
+    capture = Capture(capture_largs(tmp_path, "msg~boom", after=1))
+    lines = [
+        "01-15 10:00:00.000  123  123 I Foo: too early",
+        "01-15 10:00:40.000  123  123 I Foo: before",
+        "01-15 10:01:00.000  123  123 E Foo: boom happened",
+    ]
+    parsed_batches(("main", lines), None, "threadtime", capture)
+    assert [x[1] for x in capture.pending.entries] == lines[1:]
+    parsed_batches(("main", ["01-15 10:01:02.000  123  123 I Foo: after"]), None, "threadtime", capture)
+    text = wait_for_capture(tmp_path)
+    assert "too early" not in text
+    assert "after" in text
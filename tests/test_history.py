@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+
+import pytest
+
+from adblogs import history
+from adblogs.arguments import log_args
+from adblogs.history import (
+    add_history,
+    compact_history,
+    history_record,
+    migrate_legacy_history,
+    parse_history_record,
+    ranked_history,
+    read_history,
+)
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return tmp_path / "adb_log_history.tsv"
+
+
+def records(log_file):
+    return [parse_history_record(x) for x in log_file.read_text().splitlines()]
+
+
+def test_record_round_trip():
+    assert parse_history_record(history_record("adblog -l\tE\n", 3, 1700000000.5)) == (
+        "adblog -l E ", 3, 1700000000,
+    )
+    assert parse_history_record("garbage") is None
+    assert parse_history_record("x\t1\tcmd") is None
+
+
+def test_repeat_updates_the_last_record_in_place(log_file):
+    add_history(log_file, "adblog -a")
+    add_history(log_file, "adblog -b")
+    add_history(log_file, "adblog -b")
+    add_history(log_file, "adblog -b")
+    assert [(x[0], x[1]) for x in records(log_file)] == [("adblog -a", 1), ("adblog -b", 3)]
+
+
+def test_repeat_further_back_is_appended(log_file):
+    add_history(log_file, "adblog -a")
+    add_history(log_file, "adblog -b")
+    add_history(log_file, "adblog -a")
+    assert len(records(log_file)) == 3
+    entries, count = read_history(log_file)
+    assert count == 3
+    assert entries["adblog -a"][0] == 2
+
+
+def test_last_record_longer_than_the_tail(log_file, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_TAIL_BYTES", 16)
+    cmd = "adblog " + "-f x " * 10
+    add_history(log_file, cmd)
+    add_history(log_file, cmd)
+    # Can't see the last record whole, so it's appended and merged on read
+    assert read_history(log_file)[0][cmd][0] == 2
+
+
+def test_short_file_read_from_the_start(log_file, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_TAIL_BYTES", 4096)
+    add_history(log_file, "adblog -a")
+    add_history(log_file, "adblog -a")
+    assert records(log_file)[0][1] == 2
+
+
+def test_compaction_past_the_size(log_file, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_COMPACT_BYTES", 200)
+    for i in range(20):
+        add_history(log_file, f"adblog -f {i % 3}")
+    record_bytes = len(history_record("adblog -f 0", 1, time.time()))
+    assert log_file.stat().st_size <= 200 + record_bytes
+    entries, count = read_history(log_file)
+    assert len(entries) == 3
+    assert count < 20
+    assert sum([x[0] for x in entries.values()]) == 20
+    # The most recent stays last so a repeat still updates in place
+    assert records(log_file)[-1][0] == "adblog -f 1"
+
+
+def test_compaction_keeps_the_top_entries(log_file, monkeypatch):
+    monkeypatch.setattr(history, "MAX_HISTORY_ENTRIES", 2)
+    now = int(time.time())
+    entries = {"old": [50, now - 60 * 60 * 24 * 30], "busy": [10, now - 10], "once": [1, now - 5]}
+    compact_history(log_file, entries)
+    # Best two by frecency, written oldest first
+    assert [x[0] for x in records(log_file)] == ["old", "busy"]
+    assert [x[0] for x in ranked_history(entries)] == ["busy", "old", "once"]
+
+
+def test_legacy_migration(log_file):
+    legacy = log_file.parent / history.LEGACY_HISTORY_FILE
+    legacy.write_text("adblog -a\nadblog -b\n\nadblog -a\n")
+    os.utime(legacy, (1700000000, 1700000000))
+    migrate_legacy_history(log_file)
+    entries, _ = read_history(log_file)
+    assert entries == {"adblog -a": [2, 1700000000 - 1], "adblog -b": [1, 1700000000 - 2]}
+    assert records(log_file)[-1][0] == "adblog -a"
+
+
+def test_legacy_migration_only_once(log_file):
+    legacy = log_file.parent / history.LEGACY_HISTORY_FILE
+    legacy.write_text("adblog -a\n")
+    add_history(log_file, "adblog -b")
+    migrate_legacy_history(log_file)
+    assert list(read_history(log_file)[0]) == ["adblog -b"]
+
+
+def test_written_command_skips_defaults(monkeypatch, tmp_path):
+    argv = ["adblogs", "--log-history-dir", str(tmp_path), "-l", "e", "--fp", "Foo", "--capture-before", "30"]
+    monkeypatch.setattr(sys, "argv", argv)
+    log_args()
+    log_file = tmp_path / "adb_log_history.tsv"
+    for _ in range(100):
+        if log_file.exists() and log_file.read_text():
+            break
+        time.sleep(0.02)
+    cmd = records(log_file)[-1][0]
+    assert '-l "E"' in cmd
+    assert '--fp "Foo"' in cmd
+    assert "--capture-before" not in cmd
+    assert "--context" not in cmd
@@ -0,0 +1,69 @@
+import sys
+
+import pytest
+
+import adblogs._globals as g
+from adblogs import parse
+from adblogs.arguments import log_args
+from adblogs.budget import BudgetDeque
+from adblogs.colors import remove_col_from_val
+from adblogs.line import output_line, refilter_buffer, render_batch
+from adblogs.timeline import TimeIndex
+
+LINES = [
+    "01-15 10:00:00.000  123  123 I Foo: first",
+    "not a log line",
+    "01-15 10:00:01.000  123  123 E Bar: second",
+]
+
+
+@pytest.fixture
+def largs(monkeypatch, tmp_path):
+    monkeypatch.setattr(parse, "STREAM_FORMATS", {})
+    monkeypatch.setattr(g, "RAW_BUFFER", TimeIndex(1024 * 1024))
+    monkeypatch.setattr(g, "LINE_BUFFER", BudgetDeque(1024 * 1024))
+    monkeypatch.setattr(g, "CURRENT_LINE_NUMBER", 0)
+    monkeypatch.setattr(g, "UNPARSED_LINES", 0)
+    monkeypatch.setattr(sys, "argv", ["adblogs", "--log-history-dir", str(tmp_path), "-t", "-n"])
+    return log_args()
+
+
+def show(largs, lines, buffer="main"):
+    columns = parse.parse_batch(lines, buffer)
+    g.RAW_BUFFER.extend(buffer, lines, columns[0], columns[1])
+    for rendered in render_batch(lines, largs, buffer, columns):
+        output_line(*rendered, largs)
+
+
+def numbers():
+    return [int(remove_col_from_val(x).split(" ")[0]) for x in g.LINE_BUFFER]
+
+
+def test_refilter_doesnt_count_unparsed_again(largs):
+    show(largs, LINES)
+    assert g.UNPARSED_LINES == 1
+    refilter_buffer(largs)
+    refilter_buffer(largs)
+    assert g.UNPARSED_LINES == 1
+
+
+def test_refilter_numbering_carries_on(largs):
+    show(largs, LINES)
+    largs.level = "E"
+    refilter_buffer(largs)
+    assert numbers() == [0]
+    show(largs, ["01-15 10:00:02.000  123  123 E Bar: third"])
+    assert numbers() == [0, 1]
+    assert "third" in g.LINE_BUFFER[-1]
+
+
+def test_refilter_leaves_the_stream_parser_alone(largs):
+    largs.format = "long"
+    lines = ["[ 01-15 10:00:00.000  123:  123 I/Foo ]", "first"]
+    show(largs, lines)
+    parser = parse.STREAM_FORMATS["main"]
+    parser.header = ("01-15", "10:00:05.000", "9", "9", "W", "Mid")
+    refilter_buffer(largs)
+    assert parse.STREAM_FORMATS["main"] is parser
+    assert parser.header[5] == "Mid"
+    assert any(["first" in x for x in g.LINE_BUFFER])
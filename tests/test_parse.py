@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from adblogs import parse
+from adblogs.parse import FORMATS, LongParser, detect_format, get_parser, parse_batch, split_timestamp
+
+SAMPLES = {
+    "threadtime": "01-15 10:22:33.123  1234  1235 D Some Tag: message: with colon",
+    "uid": "01-15 10:22:33.123  1000  1234  1235 D Some Tag: message: with colon",
+    "time": "01-15 10:22:33.123 D/Some Tag( 1234): message: with colon",
+    "brief": "D/Some Tag( 1234): message: with colon",
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_formats(monkeypatch):
+    monkeypatch.setattr(parse, "STREAM_FORMATS", {})
+
+
+@pytest.mark.parametrize("fmt", list(SAMPLES))
+def test_detect_format(fmt):
+    assert detect_format(["--------- beginning of main", SAMPLES[fmt]]) == fmt
+
+
+@pytest.mark.parametrize("fmt", list(SAMPLES))
+def test_only_its_own_parser_reads_a_format(fmt):
+    for other in FORMATS:
+        parsed = get_parser(other)(SAMPLES[fmt])
+        if other == fmt:
+            assert parsed[4:] == ("D", "Some_Tag", "message: with colon")
+        elif other != "long":
+            assert parsed is None
+
+
+def test_threadtime_fields():
+    assert parse.parse_threadtime(SAMPLES["threadtime"]) == (
+        "01-15", "10:22:33.123", "1234", "1235", "D", "Some_Tag", "message: with colon",
+    )
+
+
+def test_uid_skips_the_uid():
+    assert parse.parse_uid(SAMPLES["uid"])[2:4] == ("1234", "1235")
+
+
+def test_time_and_brief_have_no_tid():
+    assert parse.parse_time(SAMPLES["time"])[:4] == ("01-15", "10:22:33.123", "1234", None)
+    assert parse.parse_brief(SAMPLES["brief"])[:4] == (None, None, "1234", None)
+
+
+def test_brief_with_uid_modifier():
+    assert parse.parse_brief("I/Foo( 1000: 1234): hi")[2] == "1234"
+
+
+def test_brief_without_message():
+    assert parse.parse_brief("I/Foo( 1234)")[4:] == ("I", "Foo", "")
+
+
+def test_year_timestamp():
+    line = "2024-01-15 10:22:33.123456  1234  1235 I Foo: hi"
+    assert parse.parse_threadtime(line)[:2] == ("2024-01-15", "10:22:33.123456")
+    assert detect_format([line]) == "threadtime"
+
+
+def test_epoch_timestamp():
+    local = time.localtime(1705312953)
+    assert split_timestamp("1705312953.123  1234  1235 I Foo: hi") == (
+        time.strftime("%m-%d", local),
+        time.strftime("%H:%M:%S", local) + ".123",
+        "  1234  1235 I Foo: hi",
+    )
+    assert detect_format(["1705312953.123  1234  1235 I Foo: hi"]) == "threadtime"
+
+
+def test_not_a_timestamp():
+    assert split_timestamp("hello there") is None
+    assert split_timestamp("12.5") is None
+
+
+def test_long():
+    lines = [
+        "[ 01-15 10:22:33.123  1234: 1235 W/Foo ]",
+        "first line",
+        "second line",
+        "",
+        "[ 01-15 10:22:34.000  1234: 1236 E/Bar Baz ]",
+        "other",
+    ]
+    assert detect_format(lines) == "long"
+    parser = LongParser()
+    parsed = [parser(x) for x in lines]
+    assert parsed[0] == ("01-15", "10:22:33.123", "1234", "1235", "W", "Foo", "")
+    assert parsed[2] == ("01-15", "10:22:33.123", "1234", "1235", "W", "Foo", "second line")
+    assert parsed[5] == ("01-15", "10:22:34.000", "1234", "1236", "E", "Bar_Baz", "other")
+
+
+def test_long_before_a_header():
+    assert LongParser()("orphan") is None
+
+
+def test_nothing_detected():
+    assert detect_format(["hello", "there"]) is None
+
+
+def test_parse_batch_detects_once_per_stream():
+    columns = parse_batch([SAMPLES["brief"], "junk"], "main")
+    assert columns[5] == ["Some_Tag", None]
+    assert columns[0] == [None, None]
+    # The stream stays brief, a threadtime line isn't read
+    assert parse_batch([SAMPLES["threadtime"]], "main")[5] == [None]
+    assert parse_batch([SAMPLES["threadtime"]], "crash")[5] == ["Some_Tag"]
+
+
+def test_parse_batch_forced_format():
+    assert parse_batch([SAMPLES["threadtime"]], "main", "uid")[5] == [None]
+
+
+def test_fresh_formats_copies_stateful_parsers():
+    parse_batch(["[ 01-15 10:22:33.123  1234: 1235 W/Foo ]"], "main", "long")
+    parse_batch([SAMPLES["brief"]], "crash")
+    formats = parse.fresh_formats()
+    assert formats["crash"] is parse.parse_brief
+    assert isinstance(formats["main"], LongParser)
+    assert formats["main"] is not parse.STREAM_FORMATS["main"]
+    assert formats["main"].header is None
@@ -0,0 +1,128 @@
+import pytest
+
+from adblogs.query import All, Any, Not, QueryRecord, compile_query
+
+
+def record(level="I", tag="Foo", msg="hello", buffer="main", pid="42"):
+    return QueryRecord(level, tag, msg, buffer, pid)
+
+
+def test_and_binds_tighter_than_or():
+    plan = compile_query("tag=Foo & level>=W | msg~boom")
+    assert isinstance(plan, Any)
+    assert plan(record(level="E"))
+    assert plan(record(tag="Bar", msg="boom"))
+    assert not plan(record(level="I"))
+    assert not plan(record(tag="Bar", level="E"))
+
+
+def test_parens_override_precedence():
+    plan = compile_query("tag=Foo & (level>=W | msg~boom)")
+    assert isinstance(plan, All)
+    assert plan(record(msg="boom"))
+    assert not plan(record(tag="Bar", msg="boom"))
+
+
+def test_word_operators():
+    plan = compile_query("tag=Foo and not level=d or msg~boom")
+    assert plan(record())
+    assert not plan(record(level="D"))
+    assert plan(record(tag="Bar", msg="boom"))
+
+
+def test_negation():
+    plan = compile_query("!tag=Foo")
+    assert isinstance(plan, Not)
+    assert not plan(record())
+    assert plan(record(tag="Bar"))
+    assert compile_query("!!tag=Foo")(record())
+    assert compile_query("!(tag=Foo | tag=Bar)")(record(tag="Baz"))
+
+
+def test_negated_ops():
+    assert compile_query("tag!=Foo,Bar")(record(tag="Baz"))
+    assert not compile_query("tag!=Foo,Bar")(record(tag="Bar"))
+    assert compile_query("msg!~boom")(record())
+    assert not compile_query("msg!~BOOM")(record(msg="a boom"))
+
+
+def test_comma_values_match_any():
+    plan = compile_query("tag=Foo,Bar")
+    assert plan(record(tag="Bar"))
+    assert not plan(record(tag="Baz"))
+
+
+def test_level_is_case_insensitive():
+    assert compile_query("level=e")(record(level="E"))
+    assert compile_query("level>=w")(record(level="E"))
+    assert not compile_query("level!=i")(record(level="I"))
+
+
+def test_quoted_value():
+    plan = compile_query('msg~"zombie chromium" & tag=Foo')
+    assert plan(record(msg="a Zombie Chromium process"))
+    assert not plan(record(msg="zombie"))
+
+
+def test_quoted_value_escapes():
+    plan = compile_query(r'msg~"say \"hi\" (now)"')
+    assert plan(record(msg='they say "hi" (now)'))
+
+
+def test_numbers():
+    assert compile_query("pid>40")(record())
+    assert not compile_query("pid<40")(record())
+    assert not compile_query("pid>40")(record(pid=None))
+
+
+def test_unparsed_record():
+    plan = compile_query("tag=Foo | msg~boom")
+    assert plan(QueryRecord(None, None, "garbage boom"))
+    assert not compile_query("level>=W")(QueryRecord(None, None, "garbage"))
+
+
+def test_meta_fields():
+    msg = '{"message": "started {\\"x\\": 2}", "params": {}, "meta": {"name": "Player"}}'
+    assert compile_query("name=Player")(record(msg=msg))
+    assert compile_query("meta.x=2")(record(msg=msg))
+    assert not compile_query("name=Player")(record())
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        'msg~"unterminated',
+        "msg~",
+        "tag=Foo &",
+        "tag=Foo | | tag=Bar",
+        "(tag=Foo",
+        "tag=Foo)",
+        "!",
+        "nope=1",
+        "level>=Q",
+        "pid>many",
+        "tag",
+    ],
+)
+def test_bad_queries(query):
+    with pytest.raises(ValueError):
+        compile_query(query)
+
+
+def test_replan_puts_the_selective_child_first(monkeypatch):
+    monkeypatch.setattr("adblogs.query.REPLAN_EVERY", 10)
+    plan = compile_query("level=I & msg~boom")
+    # Same cost order at first, level is cheaper
+    assert plan.children[0].field == "level"
+    # Level passes every line and msg rejects every line, so msg goes first after a replan
+    for _ in range(11):
+        plan(record(msg="quiet"))
+    assert [x.field for x in plan.children] == ["msg", "level"]
+
+
+def test_replan_keeps_results():
+    plan = compile_query("level=I & msg~boom | tag=Bar")
+    for i in range(2500):
+        msg = "boom" if i % 7 == 0 else "quiet"
+        expected = msg == "boom"
+        assert plan(record(msg=msg)) == expected
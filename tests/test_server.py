@@ -0,0 +1,62 @@
+import io
+import json
+import sys
+
+import pytest
+
+from adblogs.arguments import log_args
+from adblogs.line import render_batch
+from adblogs.server import subscriber_largs
+
+
+@pytest.fixture
+def server_largs(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, "argv", ["adblogs", "--log-history-dir", str(tmp_path), "-l", "W"])
+    return log_args()
+
+
+def handshake(msg):
+    return io.StringIO(json.dumps(msg) + "\n")
+
+
+def test_client_filters_on_top_of_the_server(server_largs):
+    largs = subscriber_largs(handshake({"show_prefixes": ["Foo"], "raw": True}), server_largs)
+    assert largs.show_prefixes == {"Foo"}
+    assert largs.raw
+    # Not sent, so the server's
+    assert largs.level == "W"
+    assert server_largs.show_prefixes == frozenset()
+
+
+def test_client_only_sets_filters_and_rendering(server_largs):
+    largs = subscriber_largs(handshake({"workers": 8, "log_history_dir": "/", "format": "x"}), server_largs)
+    assert largs.workers == server_largs.workers
+    assert "log_history_dir" not in vars(largs)
+    assert largs.format == server_largs.format
+
+
+@pytest.mark.parametrize(
+    "msg",
+    [
+        {"query": "tag=("},
+        {"level": "Z"},
+        {"show_prefixes": "Foo"},
+        {"raw": "yes"},
+        ["not", "an", "object"],
+        "tag=Foo",
+    ],
+)
+def test_bad_client_filters_rejected(server_largs, msg):
+    with pytest.raises(ValueError):
+        subscriber_largs(handshake(msg), server_largs)
+
+
+def test_client_largs_render(server_largs):
+    largs = subscriber_largs(handshake({"level": "e"}), server_largs)
+    lines = [
+        "01-15 10:00:00.000  123  123 W Foo: warned",
+        "01-15 10:00:00.000  123  123 E Foo: failed",
+    ]
+    rendered = render_batch(lines, largs, "main")
+    assert len(rendered) == 1
+    assert "failed" in rendered[0][0]
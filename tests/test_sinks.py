@@ -0,0 +1,49 @@
+import sys
+
+import pytest
+
+import adblogs._globals as g
+from adblogs import parse
+from adblogs.arguments import log_args
+from adblogs.line import render_batch, swap_args
+from adblogs.sinks import record_batch
+
+
+@pytest.fixture
+def largs(monkeypatch, tmp_path):
+    monkeypatch.setattr(parse, "STREAM_FORMATS", {})
+    monkeypatch.setattr(sys, "argv", ["adblogs", "--log-history-dir", str(tmp_path), "-t"])
+    return log_args()
+
+
+def test_device_time_keeps_milliseconds(largs):
+    records = record_batch(["01-15 10:22:33.123  1234  1235 I Foo: hello"], largs, "main")
+    assert records[0]["device_time"] == "01-15 10:22:33.123"
+    # Seconds on screen
+    rendered = render_batch(["01-15 10:22:33.123  1234  1235 I Foo: hello"], largs, "main")
+    assert "10:22:33" in rendered[0][0]
+    assert "10:22:33.123" not in rendered[0][0]
+
+
+def test_unparsed_lines_are_records(largs):
+    lines = ["01-15 10:22:33.123  1234  1235 I Foo: hello", "--------- beginning of main", "not a log line"]
+    records = record_batch(lines, largs, "main")
+    assert len(records) == 2
+    assert records[1]["message"] == "not a log line"
+    assert records[1]["buffer"] == "main"
+    assert records[1]["device_time"] is None
+    assert records[1]["tag"] is None
+
+
+def test_unparsed_records_are_filtered(largs):
+    largs.level = "W"
+    assert record_batch(["not a log line"], largs, "main") == []
+
+
+def test_status_goes_to_stderr(largs, capsys, monkeypatch):
+    monkeypatch.setattr(g, "ACTIVE_ARGS", None)
+    monkeypatch.setattr(g, "LINE_BUFFER_STALE", False)
+    swap_args(largs)
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert "Filters reloaded" in err
@@ -0,0 +1,125 @@
+import calendar
+
+import pytest
+
+from adblogs.timeline import MAX_SKEW_SECS, TimeIndex, day_start, device_seconds, time_secs
+
+
+def lines(index):
+    return [x[1] for x in index]
+
+
+def test_time_secs():
+    assert time_secs("10:22:33.123") == 10 * 3600 + 22 * 60 + 33
+    assert time_secs("10:22") == 10 * 3600 + 22 * 60
+
+
+def test_day_start_picks_the_closest_year():
+    ref = calendar.timegm((2024, 12, 31, 23, 0, 0))
+    assert day_start("01-01", ref) == calendar.timegm((2025, 1, 1, 0, 0, 0))
+    assert day_start("12-31", ref) == calendar.timegm((2024, 12, 31, 0, 0, 0))
+    assert day_start("2023-06-01", ref) == calendar.timegm((2023, 6, 1, 0, 0, 0))
+
+
+def test_bare_time_crosses_midnight():
+    ref = calendar.timegm((2024, 3, 1, 23, 59, 50))
+    assert device_seconds(None, "00:00:05", ref) == ref + 15
+    assert device_seconds(None, "23:59:40", ref) == ref - 10
+
+
+def test_index_across_midnight():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["a", "b"], ["03-01", "03-02"], ["23:59:59.500", "00:00:01.000"])
+    assert index.stamps[1] - index.stamps[0] == 2
+    index.extend("main", ["c"], None, ["00:00:02.000"])
+    assert index.stamps[2] - index.stamps[0] == 3
+    assert len(index.runs) == 1
+
+
+def test_index_across_new_year():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["a", "b"], ["12-31", "01-01"], ["23:59:59.000", "00:00:01.000"])
+    assert index.stamps[1] - index.stamps[0] == 2
+    assert [x[1] for x in index.seek("01-01 00:00:01", 0)] == ["b"]
+    assert [x[1] for x in index.seek("12-31 23:59:59", 0)] == ["a"]
+
+
+def test_small_skew_is_clamped():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["a"], ["01-15"], ["10:00:10.000"])
+    index.extend("crash", ["b"], ["01-15"], ["10:00:08.000"])
+    assert index.stamps[1] == index.stamps[0]
+    assert index.runs == [0]
+
+
+def test_lines_without_a_time_take_the_last_stamp():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["untimed"])
+    assert index.stamps == [0]
+    index.extend("main", ["a", "b"], ["01-15", None], ["10:00:10.000", None])
+    assert index.stamps[2] == index.stamps[1]
+
+
+def test_replay_starts_a_run():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["a", "b"], ["01-15"] * 2, ["11:00:00.000", "11:00:01.000"])
+    index.extend("main", ["old", "old2"], ["01-15"] * 2, ["10:00:30.000", "10:00:31.000"])
+    index.extend("main", ["new"], ["01-15"], ["11:00:02.000"])
+    assert index.runs == [0, 2]
+    assert [x[1] for x in index.seek("10:00:30", 1)] == ["old", "old2"]
+    # Read order across runs
+    assert [x[1] for x in index.seek("11:00:01", 1)] == ["a", "b", "new"]
+    assert lines(index) == ["a", "b", "old", "old2", "new"]
+
+
+def test_jump_back_just_over_the_skew():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["a"], ["01-15"], ["10:00:10.000"])
+    index.extend("main", ["b"], ["01-15"], [f"10:00:{9 - MAX_SKEW_SECS:02d}.000"])
+    assert index.runs == [0, 1]
+
+
+def test_eviction_and_compaction():
+    line = "x" * 100
+    size = TimeIndex.entry_size(line)
+    index = TimeIndex(10 * size)
+    for i in range(15):
+        index.extend("main", [f"{i:03d}" + line[3:]], ["01-15"], [f"10:00:{i:02d}.000"])
+    assert len(index) == 10
+    assert index.bytes == 10 * size
+    assert lines(index)[0].startswith("005")
+    # Evicted entries are dropped from the lists once they're over half
+    assert index.start <= len(index.entries) // 2
+    assert index.seek("10:00:02", 1) == []
+    assert len(index.seek("10:00:06", 1)) == 3
+
+
+def test_compaction_keeps_runs_lined_up():
+    size = TimeIndex.entry_size("a")
+    index = TimeIndex(4 * size)
+    times = ["10:00:10", "10:00:11", "10:00:00", "10:00:01", "10:00:02", "09:00:00", "09:00:01"]
+    for i, time in enumerate(times):
+        index.extend("main", [chr(ord("a") + i)], ["01-15"], [time + ".000"])
+    assert lines(index) == ["d", "e", "f", "g"]
+    assert index.runs[0] == 0
+    assert [x[1] for x in index.window(0, 10 ** 12)] == ["d", "e", "f", "g"]
+    assert [x[1] for x in index.seek("09:00:00", 0)] == ["f"]
+    assert [x[1] for x in index.seek("10:00:01", 1)] == ["d", "e"]
+
+
+def test_seek():
+    index = TimeIndex(1024 * 1024)
+    assert index.seek("10:00", 5) == []
+    index.extend("main", ["a"], ["2024-01-15"], ["10:00:00.000"])
+    assert index.seek(" 2024-01-15 10:00 ", 0) == [("main", "a")]
+    with pytest.raises(ValueError):
+        index.seek("soon", 5)
+
+
+def test_clear():
+    index = TimeIndex(1024 * 1024)
+    index.extend("main", ["a", "b"], ["01-15"] * 2, ["11:00:00.000", "10:00:00.000"])
+    index.clear()
+    assert len(index) == 0
+    assert index.bytes == 0
+    assert index.runs == [0]